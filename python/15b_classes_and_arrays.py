@@ -0,0 +1,772 @@
+# Classes and NumPy Arrays
+
+"""
+Topics
+------
+Columnar Storage for Many Points
+Array-Backed Vector Arithmetic
+Bulk Reductions: Vector.sum(), mean() and stack()
+Fused Transform Chains
+Zero-Copy Bulk Constructors
+"""
+
+import array
+import math
+import time
+import numpy as np
+
+
+print()
+print('Columnar Storage for Many Points:')
+print('---------------------------------------')
+
+# In the Classes and Objects lecture we stored each Point as a separate object
+# with its own x, y, z attributes, and looped over a list of Points to compute
+# distances one pair at a time.  That is fine for a handful of points, but an
+# engineering point cloud (e.g. from a 3D scanner) can hold hundreds of
+# thousands of points.  Every Point is a separate Python object, and every call
+# to distance() runs through the Python interpreter.
+#
+# A better layout for large data sets is _columnar_ storage: keep all of the
+# x values together in one array, all of the y values in a second array, and
+# all of the z values in a third.  NumPy can then operate on entire columns at
+# once, without a Python-level loop.
+#
+# Here is the Point class from the Classes and Objects lecture:
+
+class Point:
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):      # distance to a second Point
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):           # distance from origin to the Point
+        return(self.distance(Point(0,0,0)))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+    def double_x(self):
+        self.x *= 2
+        return self
+    def double_y(self):
+        self.y *= 2
+        return self
+    def double_z(self):
+        self.z *= 2
+        return self
+    @classmethod
+    def point123(cls):     # factory method example
+        return cls(1,2,3)
+    @classmethod
+    def from_buffer(cls, buffer):
+        # Bulk factory method (see Zero-Copy Bulk Constructors below)
+        xyz = float64_array(buffer).reshape(-1, 3)
+        return PointCloud.from_xyz(xyz.T)
+
+
+# ---------------
+# The PointCloud class
+# ---------------
+
+# The PointCloud class stores its coordinates in a single (3, n) float64 array.
+# Each row of the array is one contiguous column of coordinates, so
+# cloud.x, cloud.y and cloud.z are views into the same block of memory
+# (no copies are made).
+
+class PointCloud:
+    """
+    Represents many points in 3D Cartesian space using columnar storage.
+
+    Attributes:
+        xyz (ndarray): float64 array of shape (3, n) holding all coordinates.
+        x, y, z (ndarray): views of the rows of xyz (each of shape (n,)).
+
+    Methods:
+        distance(p):     Returns an array of distances from each point to p, where p
+                         is a Point or a PointCloud of the same length.
+        length():        Returns an array of distances from the origin to each point.
+        stringify():     Returns an array of strings in the format "(x,y,z)".
+        point(i):        Returns a PointView of point i that shares memory with the cloud.
+        from_points(ps): Class method to build a PointCloud from a list of Points.
+    """
+    def __init__(self, x=(), y=(), z=()):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        if not (x.shape == y.shape == z.shape) or x.ndim != 1:
+            raise ValueError("x, y, z must be 1D arrays of the same length")
+        self.xyz = np.empty((3, len(x)))
+        self.xyz[0] = x
+        self.xyz[1] = y
+        self.xyz[2] = z
+
+    @classmethod
+    def from_xyz(cls, xyz):
+        # Wrap an existing (3, n) float64 array without copying it.  Any other
+        # dtype is converted to float64, which makes a copy (an int array would
+        # otherwise silently truncate values such as 2.5 assigned later):
+        xyz = np.asarray(xyz, dtype=np.float64)
+        if xyz.ndim != 2 or xyz.shape[0] != 3:
+            raise ValueError("xyz must have shape (3, n)")
+        cloud = cls.__new__(cls)
+        cloud.xyz = xyz
+        return cloud
+
+    @classmethod
+    def from_points(cls, points):
+        points = list(points)
+        xyz = np.empty((3, len(points)))
+        for i, p in enumerate(points):
+            xyz[:, i] = (p.x, p.y, p.z)
+        return cls.from_xyz(xyz)
+
+    @property
+    def x(self):
+        return self.xyz[0]
+    @property
+    def y(self):
+        return self.xyz[1]
+    @property
+    def z(self):
+        return self.xyz[2]
+
+    def __len__(self):
+        return self.xyz.shape[1]
+
+    def __getitem__(self, index):
+        # An integer index returns a single PointView, while a slice returns
+        # a new PointCloud that is a view of the same memory:
+        if isinstance(index, slice):
+            return PointCloud.from_xyz(self.xyz[:, index])
+        return self.point(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield PointView(self, i)
+
+    def point(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("point index out of range")
+        return PointView(self, i)
+
+    def distance(self, p):
+        if isinstance(p, PointCloud):
+            other = p.xyz
+        else:
+            other = np.array([[p.x], [p.y], [p.z]], dtype=np.float64)
+        d = self.xyz - other
+        return np.sqrt(np.einsum('ij,ij->j', d, d))   # sum of squares down each column
+
+    def length(self):
+        return np.sqrt(np.einsum('ij,ij->j', self.xyz, self.xyz))
+
+    def stringify(self):
+        cols = self.xyz.astype(str)
+        s = np.char.add('(', cols[0])
+        s = np.char.add(np.char.add(s, ','), cols[1])
+        s = np.char.add(np.char.add(s, ','), cols[2])
+        return np.char.add(s, ')')
+
+    def to_buffer(self):
+        # Interleaved x,y,z,x,y,z,... array of shape (n, 3).  No copy is made if
+        # the cloud already wraps such an array (e.g. from Point.from_buffer()).
+        return np.ascontiguousarray(self.xyz.T)
+
+    def __str__(self):
+        return f'PointCloud with {len(self)} points'
+
+
+# A PointView behaves exactly like a Point (it inherits distance(), length(),
+# stringify() and the double_* methods), but its x, y, z attributes are
+# _properties_ that read and write directly into the columns of a PointCloud.
+# Changing a PointView therefore changes the cloud, and vice versa.
+
+class PointView(Point):
+    """A Point whose coordinates live in column i of a PointCloud."""
+    def __init__(self, cloud, i):
+        self._xyz = cloud.xyz
+        self._i = i
+    @property
+    def x(self):
+        return float(self._xyz[0, self._i])
+    @x.setter
+    def x(self, value):
+        self._xyz[0, self._i] = value
+    @property
+    def y(self):
+        return float(self._xyz[1, self._i])
+    @y.setter
+    def y(self, value):
+        self._xyz[1, self._i] = value
+    @property
+    def z(self):
+        return float(self._xyz[2, self._i])
+    @z.setter
+    def z(self, value):
+        self._xyz[2, self._i] = value
+
+
+# Build a cloud from the same four points used in the Classes and Objects lecture:
+
+p1 = Point(10, 4, 6)
+p2 = Point(-8, 7, 14)
+p3 = Point()
+p4 = Point(y=3)
+points = [p1, p2, p3, p4]
+
+cloud = PointCloud.from_points(points)
+print(cloud)
+for s, d in zip(cloud.stringify(), cloud.length()):
+    print(f'distance to {s} = {d}')
+
+print(f'distances to {p1.stringify()}:', cloud.distance(p1))
+
+# Individual points can be pulled out as PointView objects.  Since no data is
+# copied, method chaining on the view updates the cloud itself:
+
+pv = cloud[0]
+print(pv.stringify(), pv.length())
+pv.double_x().double_y().double_z()
+print(cloud.x, cloud.y, cloud.z)
+
+
+# ---------------
+# Speed comparison
+# ---------------
+
+# Let's compare computing every length with a list of Point objects against a
+# single call to PointCloud.length():
+
+n = 200_000
+rng = np.random.default_rng(0)
+coords = rng.uniform(-10, 10, size=(3, n))
+
+point_list = [Point(x, y, z) for x, y, z in coords.T.tolist()]
+cloud = PointCloud(coords[0], coords[1], coords[2])
+
+t0 = time.perf_counter()
+lengths_loop = [p.length() for p in point_list]
+t1 = time.perf_counter()
+lengths_cloud = cloud.length()
+t2 = time.perf_counter()
+
+print(f'list of Points:  {t1-t0:.4f} s')
+print(f'PointCloud:      {t2-t1:.4f} s')
+print('results agree:', np.allclose(lengths_loop, lengths_cloud))
+
+
+print()
+print('Array-Backed Vector Arithmetic:')
+print('---------------------------------------')
+
+# The Vector class from the Classes and Objects lecture adds two Vectors by
+# building a Python list with zip() and a list comprehension, and then unpacking
+# that list into a brand new Vector.  In a loop that accumulates thousands of
+# large Vectors, almost all of the time goes into creating these temporary lists,
+# tuples and objects:
+
+class TupleVector:
+    def __init__(self, *args):
+        self.coordinates = args
+    def __add__(self, other):
+        if isinstance(other, TupleVector):
+            result = [x + y for x, y in zip(self.coordinates, other.coordinates)]
+        elif isinstance(other, float) or isinstance(other, int):
+            result = [x + other for x in self.coordinates]
+        return TupleVector(*result)
+    def __radd__(self,other):
+        if isinstance(other, float) or isinstance(other, int):
+            result = [x + other for x in self.coordinates]
+        return TupleVector(*result)
+
+# Instead, we can store the coordinates in a NumPy array.  The binary operators
+# (+, -, *, @) then each make exactly one new array, and the _in-place_ operators
+# (+=, -=, *=) are overridden through the __iadd__, __isub__ and __imul__ magic
+# methods to write the result straight back into the existing array using the
+# out= argument of NumPy's arithmetic functions.  No temporaries are created.
+#
+# Scalars are _broadcast_ across every coordinate, just as in the earlier
+# Vector + number example.
+
+class Vector:
+    """
+    n-dimensional vector stored in a float64 NumPy array
+    arguments: individual n-dimensional axis values
+
+    Operators:
+        v + w, v - w, v * w   element-wise (w may be a Vector or a number)
+        v @ w                 dot product (returns a float)
+        v += w, v -= w, v *= w   in-place, no new arrays are created
+    """
+    def __init__(self, *args):
+        self.coordinates = np.array(args, dtype=np.float64)
+
+    @classmethod
+    def _wrap(cls, array):
+        # Build a Vector around an existing array (used internally to avoid
+        # unpacking results back into individual arguments):
+        v = cls.__new__(cls)
+        v.coordinates = array
+        return v
+
+    def _operand(self, other):
+        # Return the array (or number) to combine with this Vector:
+        if isinstance(other, Vector):
+            if other.coordinates.shape != self.coordinates.shape:
+                raise ValueError("Vectors must be of the same length")
+            return other.coordinates
+        elif isinstance(other, (int, float, np.number)):
+            return other
+        raise TypeError("Values must be Vector and Vector or Vector and number")
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def magnitude(self):
+        return math.sqrt(self @ self)
+
+    def __add__(self, other):
+        return Vector._wrap(np.add(self.coordinates, self._operand(other)))
+    def __radd__(self, other):
+        return self + other
+    def __sub__(self, other):
+        return Vector._wrap(np.subtract(self.coordinates, self._operand(other)))
+    def __rsub__(self, other):
+        return Vector._wrap(np.subtract(self._operand(other), self.coordinates))
+    def __mul__(self, other):
+        return Vector._wrap(np.multiply(self.coordinates, self._operand(other)))
+    def __rmul__(self, other):
+        return self * other
+    def __neg__(self):
+        return Vector._wrap(np.negative(self.coordinates))
+
+    def __matmul__(self, other):
+        if not isinstance(other, Vector):
+            raise TypeError("Can only take dot product of Vector with another Vector")
+        return float(np.dot(self.coordinates, self._operand(other)))
+
+    # In-place operators must return self, so that "v += w" rebinds v to the
+    # same (now updated) object:
+    def __iadd__(self, other):
+        np.add(self.coordinates, self._operand(other), out=self.coordinates)
+        return self
+    def __isub__(self, other):
+        np.subtract(self.coordinates, self._operand(other), out=self.coordinates)
+        return self
+    def __imul__(self, other):
+        np.multiply(self.coordinates, self._operand(other), out=self.coordinates)
+        return self
+
+    def __str__(self):
+        return f'{len(self.coordinates)}-D vector: {self.coordinates}'
+
+    @classmethod
+    def from_array(cls, buffer):
+        """
+        Wrap a 1D array as one Vector, or each row of a 2D array as a Vector,
+        sharing memory with the array (see Zero-Copy Bulk Constructors below).
+        """
+        data = float64_array(buffer)
+        if data.ndim == 1:
+            return cls._wrap(data)
+        if data.ndim == 2:
+            return [cls._wrap(row) for row in data]
+        raise ValueError("array must be 1D or 2D")
+
+    # Bulk reductions over many Vectors (see the next section):
+
+    @classmethod
+    def _blocks(cls, vectors, block_size):
+        # Copy the coordinates of consecutive Vectors into one reusable
+        # (block_size, n) buffer, yielding each filled part of the buffer:
+        buffer = None
+        k = 0
+        for v in vectors:
+            if buffer is None:
+                buffer = np.empty((block_size, len(v.coordinates)))
+            elif len(v.coordinates) != buffer.shape[1]:
+                raise ValueError("Vectors must be of the same length")
+            buffer[k] = v.coordinates
+            k += 1
+            if k == block_size:
+                yield buffer
+                k = 0
+        if k > 0:
+            yield buffer[:k]
+
+    @classmethod
+    def _total(cls, vectors, block_size):
+        # Return (sum of coordinates, number of Vectors) in a single pass:
+        total = None
+        count = 0
+        for block in cls._blocks(vectors, block_size):
+            if total is None:
+                total = block.sum(axis=0)
+            else:
+                total += block.sum(axis=0)
+            count += len(block)
+        if total is None:
+            raise ValueError("cannot reduce an empty collection of Vectors")
+        return total, count
+
+    @classmethod
+    def sum(cls, vectors, block_size=1024):
+        """Return the sum of an iterable of Vectors (list, generator, ...)."""
+        total, count = cls._total(vectors, block_size)
+        return cls._wrap(total)
+
+    @classmethod
+    def mean(cls, vectors, block_size=1024):
+        """Return the average of an iterable of Vectors."""
+        total, count = cls._total(vectors, block_size)
+        total /= count
+        return cls._wrap(total)
+
+    @classmethod
+    def stack(cls, vectors):
+        """Return a (number of Vectors, n) array holding all coordinates."""
+        arrays = [v.coordinates for v in vectors]   # references, not copies
+        if not arrays:
+            raise ValueError("cannot stack an empty collection of Vectors")
+        return np.stack(arrays)
+
+v1 = Vector(1,12,4,7)
+v2 = Vector(-9,0,4,4)
+print(v1 + v2)
+print(v1 - v2)
+print(v1 * 2)
+print(20 + v1)
+print(10 - v1)
+print('v1 @ v2 =', v1 @ v2)
+
+try:
+    v1 + Vector(1,2)
+except ValueError as e:
+    print(e)
+
+try:
+    v1 + 'x'
+except TypeError as e:
+    print(e)
+
+# The in-place operators update v1 without allocating a new Vector:
+before = id(v1.coordinates)
+v1 += v2
+v1 *= 0.5
+print(v1)
+print('same array:', id(v1.coordinates) == before)
+
+
+# ---------------
+# Speed comparison
+# ---------------
+
+# Accumulate 2000 vectors of length 1000 with the tuple-based Vector and with
+# the array-backed Vector using +=:
+
+n_vec, dim = 2000, 1000
+data = rng.standard_normal((n_vec, dim))
+
+tuple_vectors = [TupleVector(*row) for row in data.tolist()]
+array_vectors = [Vector._wrap(row) for row in data]
+
+t0 = time.perf_counter()
+total_tuple = TupleVector(*([0.0]*dim))
+for v in tuple_vectors:
+    total_tuple = total_tuple + v
+t1 = time.perf_counter()
+total_array = Vector(*([0.0]*dim))
+for v in array_vectors:
+    total_array += v
+t2 = time.perf_counter()
+
+print(f'tuple-based Vector +:   {t1-t0:.4f} s')
+print(f'array-backed Vector +=: {t2-t1:.4f} s')
+print('results agree:', np.allclose(total_tuple.coordinates, total_array.coordinates))
+
+
+print()
+print('Bulk Reductions: Vector.sum(), mean() and stack():')
+print('---------------------------------------')
+
+# Because the Vector class defines __radd__, the built-in sum() function can add
+# up a list of Vectors (sum() starts from the number 0, so the first step is
+# 0 + Vector).  However, sum() still calls __add__ once per element and creates
+# a new Vector every time.
+#
+# The class methods Vector.sum(), Vector.mean() and Vector.stack() instead gather
+# the coordinates into a single array and let NumPy reduce them in one pass.
+# sum() and mean() copy the Vectors into a fixed-size buffer one block at a time,
+# so they also accept a _generator_ of Vectors and never need to hold the whole
+# data set in memory.
+
+vectors = [Vector(1,2,3), Vector(4,5,6), Vector(7,8,9)]
+print('sum():        ', sum(vectors))
+print('Vector.sum(): ', Vector.sum(vectors))
+print('Vector.mean():', Vector.mean(vectors))
+print('Vector.stack():\n', Vector.stack(vectors))
+
+# Stream 100,000 random Vectors from a generator without building a list:
+
+def random_vectors(count, dim):
+    for _ in range(count):
+        yield Vector._wrap(rng.standard_normal(dim))
+
+print('mean of streamed Vectors:', Vector.mean(random_vectors(100_000, 3)))
+
+# Speed comparison with the built-in sum() for 200,000 small (3-D) Vectors:
+
+small_vectors = [Vector._wrap(row) for row in rng.standard_normal((200_000, 3))]
+
+t0 = time.perf_counter()
+total_builtin = sum(small_vectors)
+t1 = time.perf_counter()
+total_bulk = Vector.sum(small_vectors)
+t2 = time.perf_counter()
+
+print(f'sum(list_of_vectors): {t1-t0:.4f} s')
+print(f'Vector.sum():         {t2-t1:.4f} s')
+print('results agree:', np.allclose(total_builtin.coordinates, total_bulk.coordinates))
+
+
+print()
+print('Fused Transform Chains:')
+print('---------------------------------------')
+
+# The method chaining example from the Classes and Objects lecture,
+#
+#     p.double_x().double_y().double_z()
+#
+# makes three separate Python method calls for every Point.  Applying the chain
+# to a list of 200,000 Points costs 600,000 calls.
+#
+# Scaling, translating and rotating are all _affine transformations_, and any
+# affine transformation of 3D points can be written as a 4x4 matrix acting on
+# _homogeneous coordinates_ (x, y, z, 1).  Applying one transformation after
+# another is the same as multiplying their matrices, so an entire chain of
+# operations can be _fused_ into a single 4x4 matrix.  That matrix can then be
+# applied to every point with one matrix multiplication.
+#
+# The Transform class below uses method chaining just like Point does, but
+# each method only _records_ the operation (this is called _lazy_ or _deferred_
+# evaluation).  Nothing is computed until compile() or apply() is called.
+
+class Transform:
+    """
+    Lazy chain of affine transformations of 3D points.
+
+    Methods (each returns self for chaining):
+        scale(sx, sy=None, sz=None):   scale each axis (sy, sz default to sx)
+        translate(dx=0, dy=0, dz=0):   shift each axis
+        rotate_x(a), rotate_y(a), rotate_z(a):   rotate by angle a (radians) about an axis
+        double_x(), double_y(), double_z():      same as the Point methods
+
+    Other methods:
+        compile(): Returns the fused 4x4 matrix (cached until the chain changes).
+        apply(target, out=None): Applies the fused matrix to an (n, 3) array (returning
+                   a new array, or filling out), or updates a PointCloud or a list of
+                   Points in place.
+    """
+    def __init__(self):
+        self.steps = []           # recorded 4x4 matrices, in order of application
+        self._matrix = None
+
+    def _record(self, matrix):
+        self.steps.append(matrix)
+        self._matrix = None       # the chain changed, so the fused matrix is stale
+        return self
+
+    def scale(self, sx, sy=None, sz=None):
+        sy = sx if sy is None else sy
+        sz = sx if sz is None else sz
+        return self._record(np.diag([sx, sy, sz, 1.0]))
+
+    def translate(self, dx=0, dy=0, dz=0):
+        m = np.eye(4)
+        m[:3, 3] = (dx, dy, dz)
+        return self._record(m)
+
+    def _rotate(self, a, i, j):
+        # rotation in the plane of axes i and j
+        c, s = math.cos(a), math.sin(a)
+        m = np.eye(4)
+        m[i, i], m[i, j], m[j, i], m[j, j] = c, -s, s, c
+        return self._record(m)
+
+    def rotate_x(self, a):
+        return self._rotate(a, 1, 2)
+    def rotate_y(self, a):
+        return self._rotate(a, 2, 0)
+    def rotate_z(self, a):
+        return self._rotate(a, 0, 1)
+
+    def double_x(self):
+        return self.scale(2, 1, 1)
+    def double_y(self):
+        return self.scale(1, 2, 1)
+    def double_z(self):
+        return self.scale(1, 1, 2)
+
+    def compile(self):
+        if self._matrix is None:
+            m = np.eye(4)
+            for step in self.steps:
+                m = step @ m      # later steps multiply on the left
+            self._matrix = m
+        return self._matrix
+
+    def apply(self, target, out=None):
+        m = self.compile()
+        A, t = m[:3, :3], m[:3, 3]
+        if isinstance(target, PointCloud):
+            # xyz has shape (3, n), so the matrix multiplies from the left:
+            target.xyz[:] = A @ target.xyz + t[:, None]
+            return target
+        if isinstance(target, np.ndarray):
+            result = np.matmul(target, A.T, out=out)
+            result += t
+            return result
+        # Otherwise, a list of Point objects: gather, transform, scatter back
+        xyz = np.array([(p.x, p.y, p.z) for p in target], dtype=np.float64).reshape(-1, 3)
+        xyz = xyz @ A.T + t
+        for p, (x, y, z) in zip(target, xyz.tolist()):
+            p.x, p.y, p.z = x, y, z
+        return target
+
+    def __str__(self):
+        return f'Transform with {len(self.steps)} steps:\n{self.compile()}'
+
+
+# The same chain as in the lecture, now recorded and fused:
+
+chain = Transform().double_x().double_y().double_z()
+print(chain)
+
+p = Point(1, 2, 3)
+chain.apply([p])
+print(p.stringify())
+
+# A longer chain: rotate 90 degrees about z, then shift up by 5:
+
+chain = Transform().rotate_z(math.pi/2).translate(dz=5)
+print(np.round(chain.apply(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])), 12))
+
+# Speed comparison: the chained Point methods on a list of Points, against one
+# fused Transform applied to a PointCloud holding the same coordinates:
+
+point_list = [Point(x, y, z) for x, y, z in coords.T.tolist()]
+cloud = PointCloud(coords[0], coords[1], coords[2])
+
+t0 = time.perf_counter()
+for p in point_list:
+    p.double_x().double_y().double_z()
+t1 = time.perf_counter()
+Transform().double_x().double_y().double_z().apply(cloud)
+t2 = time.perf_counter()
+
+print(f'chained Point methods: {t1-t0:.4f} s')
+print(f'fused Transform:       {t2-t1:.4f} s')
+print('results agree:', np.allclose(cloud.x, [p.x for p in point_list]))
+
+
+print()
+print('Zero-Copy Bulk Constructors:')
+print('---------------------------------------')
+
+# Point.point123() from the Classes and Objects lecture is a _factory method_: a
+# class method that builds an instance for us.  Data loaded from a file or a
+# sensor usually arrives as a block of numbers in memory, and building one
+# Point per row calls the constructor once per point.
+#
+# Many Python objects expose their raw memory through the _buffer protocol_:
+# NumPy arrays, bytes and bytearray objects, array.array objects (from the
+# built-in array module), and memoryview objects (a "window" onto another
+# object's memory).  NumPy can wrap any of these as an array _without copying
+# the data_.  The helper below does this, and only makes a copy when the
+# values are not already stored as float64.
+
+def float64_array(buffer):
+    """Return a float64 ndarray sharing memory with buffer whenever possible."""
+    if isinstance(buffer, np.ndarray):
+        data = buffer
+    else:
+        view = memoryview(buffer)
+        if view.format in ('B', 'b', 'c'):     # raw bytes: interpret as float64
+            data = np.frombuffer(buffer, dtype=np.float64)
+        else:
+            data = np.asarray(view)
+    return data.astype(np.float64, copy=False)
+
+# With this helper, the bulk factory methods added to the classes above are:
+#
+#    Point.from_buffer(buffer)   x,y,z,x,y,z,... values  -> PointCloud of PointViews
+#    Vector.from_array(buffer)   1D or 2D array          -> Vector or list of Vectors
+#    PointCloud.to_buffer()      PointCloud              -> (n, 3) array (x,y,z rows)
+#    Vector.stack(vectors)       list of Vectors         -> (count, n) array
+
+# An array.array holding two points.  Changing a PointView changes the original
+# array.array, since they share the same memory:
+
+raw = array.array('d', [1, 2, 3, 10, 4, 6])
+cloud = Point.from_buffer(raw)
+print(cloud, cloud.stringify())
+cloud[1].double_x()
+print(raw)
+
+# A memoryview of a bytearray works the same way:
+
+memory = bytearray(np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]).tobytes())
+cloud = Point.from_buffer(memoryview(memory))
+print(cloud.length())
+
+# Vectors wrapping the rows of a 2D array:
+
+data = np.arange(12, dtype=np.float64).reshape(4, 3)
+vectors = Vector.from_array(data)
+vectors[0] += 100
+print(data[0], np.shares_memory(vectors[2].coordinates, data))
+
+# Round trip for a large data set: wrap 1,000,000 points, double them, and export
+# them again.  The exported buffer is the original array, so no copies are made
+# at either end:
+
+data = rng.standard_normal((1_000_000, 3))
+t0 = time.perf_counter()
+cloud = Point.from_buffer(data)
+Transform().double_x().double_y().double_z().apply(cloud)
+exported = cloud.to_buffer()
+t1 = time.perf_counter()
+print(f'wrap, transform and export {len(cloud):,} points: {t1-t0:.4f} s')
+print('exported buffer is the original array:', np.shares_memory(exported, data))
+
+t0 = time.perf_counter()
+point_list = [Point(x, y, z) for x, y, z in data.tolist()]
+t1 = time.perf_counter()
+print(f'building {len(point_list):,} Point objects instead: {t1-t0:.4f} s')
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. PointCloud Centroid: Add a centroid() method to the PointCloud class that
+   returns a Point located at the mean x, y, and z values of the cloud.
+2. Bounding Box: Add a bounds() method to PointCloud that returns two Points
+   holding the minimum and maximum x, y, z values.  Do not use a loop.
+3. Views vs Copies: Create a PointCloud, slice out the first half with cloud[:n//2],
+   and double every x value in the slice.  Verify that the original cloud changed.
+4. In-Place Division: Add __truediv__ and __itruediv__ methods to the array-backed
+   Vector class so that v / 2 and v /= 2 both work.  Check that v /= 2 does not
+   change id(v.coordinates).
+5. Bulk Maximum: Following the pattern of Vector.sum(), write a class method
+   Vector.max(vectors) that returns a Vector holding the largest value of each
+   coordinate across an iterable of Vectors.
+6. Inverse Transform: Add an inverse() method to the Transform class that returns a
+   new Transform undoing the whole chain (hint: np.linalg.inv of the fused matrix).
+   Verify that applying a chain followed by its inverse returns the original points.
+7. Bytes Round Trip: Use PointCloud.to_buffer().tobytes() to convert a PointCloud to
+   a bytes object, then rebuild it with Point.from_buffer().  Why can the rebuilt
+   cloud not be modified with double_x()?
+"""
@@ -0,0 +1,462 @@
+# Classes and Memory
+
+"""
+Topics
+------
+Instance Dictionaries and __slots__
+Measuring Memory and Construction Speed
+Immutable Points, Hashing and Deduplication
+"""
+
+import copy
+import itertools
+import math
+import random
+import sys
+import time
+import tracemalloc
+import weakref
+
+
+print()
+print('Instance Dictionaries and __slots__:')
+print('---------------------------------------')
+
+# By default every instance of a class stores its attributes in its own
+# dictionary, available as the __dict__ attribute.  This is what allows us to
+# add new attributes to an object at any time.  But a dictionary is a fairly
+# large data structure, and a program that creates millions of small objects
+# (points, vectors, ...) can spend most of its memory on these dictionaries.
+
+# Here are the Point and Vector classes from the Classes and Objects lecture:
+
+class Point:
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):      # distance to a second Point
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):           # distance from origin to the Point
+        return(self.distance(Point(0,0,0)))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+
+class Vector:
+    """n-dimensional vector"""
+    def __init__(self, *args):      # pack all argument values into a tuple
+        self.coordinates = args
+    def magnitude(self):
+        return math.sqrt((sum(c**2 for c in self.coordinates)))
+
+class Vector3d(Vector):
+    """3-dimensional vector"""
+    def __init__(self, x, y, z):
+        super().__init__(x,y,z)
+    def prism_volume(self):
+        [x,y,z] = self.coordinates
+        return(x*y*z)
+
+class Vector2d(Vector):
+    """2-dimensional vector"""
+    def __init__(self, x, y):
+        super().__init__(x,y)
+    def rectangle_area(self):
+        [x,y] = self.coordinates
+        return(x*y)
+    def xy_angle(self):
+        [x,y] = self.coordinates
+        return math.atan2(y, x)
+
+p = Point(1, 2, 3)
+print(p.__dict__)
+print(Vector3d(1, 2, 3).__dict__)
+
+# Declaring a class attribute named __slots__ (a tuple of attribute names) tells
+# Python to reserve a fixed set of attribute "slots" in each instance instead of
+# creating a __dict__.  Instances become smaller and attribute access becomes
+# slightly faster.  The trade-off is that new attributes can no longer be added
+# to an instance on the fly.
+
+class SlottedPoint:
+    """
+    Represents a point in 3D Cartesian space, without a per-instance __dict__.
+
+    Attributes:
+        x (int or float): The x-coordinate. Defaults to 0.
+        y (int or float): The y-coordinate. Defaults to 0.
+        z (int or float): The z-coordinate. Defaults to 0.
+
+    Methods:
+        distance(p): Returns the Euclidean distance between the Point and another Point p.
+        length():    Returns the Euclidean distance from the origin (0,0,0) to the Point.
+        stringify(): Returns a string representation of the Point in the format "(x,y,z)".
+    """
+    __slots__ = ('x', 'y', 'z')
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):           # no need to build a temporary Point at the origin
+        return((self.x**2 + self.y**2 + self.z**2)**(1/2))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+
+sp = SlottedPoint(1, 2, 3)
+print(sp.stringify(), sp.length(), sp.distance(p))
+
+try:
+    sp.w = 4        # no __dict__, so new attributes cannot be added
+except AttributeError as e:
+    print(e)
+
+# For the Vector classes, the 2D and 3D versions always have the same number of
+# coordinates, so we can give them a _fixed layout_ with one slot per axis rather
+# than storing a separate tuple object in every instance.  The coordinates
+# attribute becomes a read-only property that builds the tuple on demand, so any
+# code using v.coordinates keeps working.
+#
+# The general n-dimensional SlottedVector still needs a tuple, since its length
+# is not known in advance.  Slots are inherited, so if SlottedVector3d were a
+# subclass of SlottedVector, every 3D vector would also carry an unused
+# coordinates slot.  Instead, all three classes share a base class with an empty
+# __slots__, and only SlottedVector adds the coordinates slot.  Note that every
+# class in the hierarchy must declare __slots__, otherwise instances would get a
+# __dict__ back.
+
+class SlottedVectorBase:
+    """Methods shared by the slotted vectors; adds no slots of its own"""
+    __slots__ = ()
+    def magnitude(self):
+        return math.sqrt((sum(c**2 for c in self.coordinates)))
+
+class SlottedVector(SlottedVectorBase):
+    """n-dimensional vector without a per-instance __dict__"""
+    __slots__ = ('coordinates',)
+    def __init__(self, *args):
+        self.coordinates = args
+
+class SlottedVector3d(SlottedVectorBase):
+    """3-dimensional vector with one slot per axis"""
+    __slots__ = ('x', 'y', 'z')
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+    @property
+    def coordinates(self):
+        return (self.x, self.y, self.z)
+    def magnitude(self):
+        return math.sqrt(self.x**2 + self.y**2 + self.z**2)
+    def prism_volume(self):
+        return(self.x*self.y*self.z)
+
+class SlottedVector2d(SlottedVectorBase):
+    """2-dimensional vector with one slot per axis"""
+    __slots__ = ('x', 'y')
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+    @property
+    def coordinates(self):
+        return (self.x, self.y)
+    def magnitude(self):
+        return math.hypot(self.x, self.y)
+    def rectangle_area(self):
+        return(self.x*self.y)
+    def xy_angle(self):
+        return math.atan2(self.y, self.x)
+
+v = SlottedVector(5,2,6,8,3)
+v3d = SlottedVector3d(1,2,3)
+v2d = SlottedVector2d(1,2)
+
+print(v.magnitude())
+print(v3d.magnitude(), v3d.coordinates)
+print(v2d.magnitude(), v2d.coordinates)
+print(v3d.prism_volume())
+print(v2d.rectangle_area())
+print(v2d.xy_angle())
+print(isinstance(v3d, SlottedVectorBase), isinstance(v3d, SlottedVector))
+
+
+print()
+print('Measuring Memory and Construction Speed:')
+print('---------------------------------------')
+
+# sys.getsizeof() reports the size of an object itself, but not the size of the
+# objects it refers to (like its __dict__).  A more complete answer comes from the
+# built-in tracemalloc module, which tracks every block of memory allocated by
+# Python.  We create many instances and divide the memory growth by the count.
+# The coordinate values are created before tracing starts, so only the memory
+# used by the instances themselves is counted.
+
+def bytes_per_instance(factory, args, n=100_000):
+    """Return the average number of bytes allocated per object by factory(*args)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(*args) for _ in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    list_bytes = sys.getsizeof(objs)     # subtract the list holding the objects
+    return (after - before - list_bytes) / n
+
+def constructions_per_second(factory, args, n=200_000):
+    """Return how many objects factory(*args) can build per second."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        factory(*args)
+    t1 = time.perf_counter()
+    return n / (t1 - t0)
+
+xyz = (1.5, -2.5, 3.5)
+cases = [
+    ('Point',            Point,           xyz),
+    ('SlottedPoint',     SlottedPoint,    xyz),
+    ('Vector (3 coords)', Vector,         xyz),
+    ('SlottedVector',    SlottedVector,   xyz),
+    ('Vector3d',         Vector3d,        xyz),
+    ('SlottedVector3d',  SlottedVector3d, xyz),
+    ('Vector2d',         Vector2d,        xyz[:2]),
+    ('SlottedVector2d',  SlottedVector2d, xyz[:2]),
+]
+
+print(f'{"class":<20}{"bytes/instance":>16}{"objects/s":>14}')
+for name, factory, args in cases:
+    size = bytes_per_instance(factory, args)
+    rate = constructions_per_second(factory, args)
+    print(f'{name:<20}{size:>16.1f}{rate:>14,.0f}')
+
+# Exact numbers depend on the Python version, but the slotted classes should use
+# a fraction of the memory of the original classes and construct faster.  The
+# fixed-layout Vector2d/Vector3d classes save the most, since they avoid both the
+# __dict__ and the coordinates tuple.
+
+
+print()
+print('Immutable Points, Hashing and Deduplication:')
+print('---------------------------------------')
+
+# Our Point classes do not define __eq__ or __hash__, so two Points with the same
+# coordinates are not considered equal (== compares object identity), and Points
+# cannot be used meaningfully as set members or dictionary keys.  Removing
+# duplicate Points from a list therefore requires comparing every pair with
+# distance(), which takes O(N^2) time.
+
+print(Point(1, 2, 3) == Point(1, 2, 3))
+
+# To use an object as a dictionary key, Python needs two magic methods:
+#   __eq__(self, other)  decides whether two objects are equal
+#   __hash__(self)       returns an integer that must be the same for equal objects
+#
+# An object's hash must never change while it is stored in a set or dictionary,
+# so hashable objects should be _immutable_.  FrozenPoint enforces this by
+# overriding __setattr__ to raise an error, and sets its attributes during
+# construction by calling object.__setattr__ directly.  Because the coordinates
+# never change, the hash is computed once and _cached_ in a slot.
+#
+# FrozenPoint also uses _hash-consing_ (also called _interning_): the class keeps
+# a dictionary of the instances that currently exist, and __new__ returns the
+# existing instance when the same coordinates are requested again.  Equal
+# FrozenPoints are then usually the very same object, saving memory.  The
+# dictionary is a weakref.WeakValueDictionary, which does not keep its values
+# alive: once a FrozenPoint is no longer used anywhere else, it disappears from the
+# dictionary automatically.  (Weak references need a __weakref__ slot.)
+#
+# The copy and pickle modules normally rebuild an object by creating an empty
+# instance and then setting its attributes, which __setattr__ forbids here.
+# __reduce__ tells them to call FrozenPoint(x, y, z) instead, so a copy of a
+# FrozenPoint is the interned instance with the same coordinates.
+
+class FrozenPoint:
+    """
+    Immutable, hashable point in 3D Cartesian space.
+
+    Attributes (read-only):
+        x, y, z (float): coordinates
+
+    Methods:
+        distance(p), length(), stringify(): as for Point
+    """
+    __slots__ = ('x', 'y', 'z', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, x=0, y=0, z=0):
+        xyz = (float(x), float(y), float(z))
+        key = (cls, xyz)        # a subclass must not get a FrozenPoint back
+        p = cls._instances.get(key)
+        if p is None:
+            p = super().__new__(cls)
+            object.__setattr__(p, 'x', xyz[0])
+            object.__setattr__(p, 'y', xyz[1])
+            object.__setattr__(p, 'z', xyz[2])
+            object.__setattr__(p, '_hash', hash(xyz))
+            cls._instances[key] = p
+        return p
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenPoint objects are immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenPoint):
+            return NotImplemented
+        return (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (type(self), (self.x, self.y, self.z))
+
+    def distance(self, p):
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):
+        return((self.x**2 + self.y**2 + self.z**2)**(1/2))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+
+a = FrozenPoint(1, 2, 3)
+b = FrozenPoint(1.0, 2.0, 3.0)
+print(a == b, a is b, hash(a) == hash(b))
+print(len({a, b, FrozenPoint(3, 2, 1)}))
+
+try:
+    a.x = 10
+except AttributeError as e:
+    print(e)
+
+print(copy.copy(a) is a, copy.deepcopy([a])[0] is a)
+
+# Exact duplicates can now be removed in O(N) time with a set or dictionary.
+# Using dict.fromkeys() keeps the points in their original order:
+
+points = [FrozenPoint(1, 2, 3), FrozenPoint(0, 0, 0), FrozenPoint(1, 2, 3)]
+print([p.stringify() for p in dict.fromkeys(points)])
+
+
+# ---------------
+# Tolerance-aware deduplication
+# ---------------
+
+# Measured data (e.g. a scanned point cloud) rarely contains _exact_ duplicates:
+# the same surface point might be recorded as (1.0, 2.0, 3.0) and
+# (1.0000003, 2.0, 2.9999998).  We want to merge points that lie within some
+# tolerance tol of each other.
+#
+# Rounding coordinates is not enough, since two nearby points can round to
+# different values.  Instead we use _spatial hashing_: divide space into cubic
+# cells of size tol, and use the integer cell coordinates
+#     (floor(x/tol), floor(y/tol), floor(z/tol))
+# as a dictionary key.  Any point within tol of a given point must lie in the same
+# cell or one of its 26 neighboring cells, so each point is compared against only
+# the few points stored in those 27 cells.  The expected total work is O(N).
+#
+# Points are processed in order, and each one is merged into the first earlier
+# kept point within tol (if any).
+#
+# Scanners often record a missing measurement as NaN ("not a number").  A point
+# with a NaN (or infinite) coordinate has no cell, and NaN is not even equal to
+# itself, so such points are only merged with points having exactly the same
+# coordinates, treating NaN as equal to NaN.
+
+NEIGHBORS = list(itertools.product((-1, 0, 1), repeat=3))
+
+def exact_key(p):
+    """Dictionary key for the exact coordinates of p, with all NaNs equal."""
+    return tuple(None if math.isnan(c) else float(c) for c in (p.x, p.y, p.z))
+
+def dedupe(points, tol=1e-9):
+    """
+    Merge points that lie within distance tol of each other.
+
+    Parameters:
+        points: list of Point-like objects (with x, y, z attributes)
+        tol:    merge tolerance (tol=0 merges exact duplicates only)
+
+    Returns:
+        unique:  list of FrozenPoints, one per group of merged points
+        mapping: list where mapping[i] is the position in unique of points[i]
+    """
+    unique, mapping = [], []
+    exact = {}        # exact key -> position in unique
+    if tol == 0:
+        for p in points:
+            key = exact_key(p)
+            if key not in exact:
+                exact[key] = len(unique)
+                unique.append(FrozenPoint(p.x, p.y, p.z))
+            mapping.append(exact[key])
+        return unique, mapping
+
+    cells = {}        # cell key -> list of positions in unique
+    for p in points:
+        if not (math.isfinite(p.x) and math.isfinite(p.y) and math.isfinite(p.z)):
+            key = exact_key(p)
+            if key not in exact:
+                exact[key] = len(unique)
+                unique.append(FrozenPoint(p.x, p.y, p.z))
+            mapping.append(exact[key])
+            continue
+        cx, cy, cz = math.floor(p.x/tol), math.floor(p.y/tol), math.floor(p.z/tol)
+        match = None
+        for dx, dy, dz in NEIGHBORS:
+            for k in cells.get((cx+dx, cy+dy, cz+dz), ()):
+                if unique[k].distance(p) <= tol:
+                    match = k
+                    break
+            if match is not None:
+                break
+        if match is None:
+            match = len(unique)
+            unique.append(FrozenPoint(p.x, p.y, p.z))
+            cells.setdefault((cx, cy, cz), []).append(match)
+        mapping.append(match)
+    return unique, mapping
+
+scan = [Point(1.0, 2.0, 3.0), Point(1.0000003, 2.0, 2.9999998),
+        Point(5, 5, 5), Point(1.0, 2.0, 3.0)]
+unique, mapping = dedupe(scan, tol=1e-3)
+print([p.stringify() for p in unique], mapping)
+print(len(dedupe(scan, tol=0)[0]), 'exact-unique points')
+nan = float('nan')
+print(dedupe(scan + [Point(nan, 0, 0), Point(nan, 0, 0), Point(1, nan, 0)], tol=1e-3)[1])
+
+# Compare with the O(N^2) approach of checking each point against every kept point:
+
+def dedupe_pairwise(points, tol):
+    unique = []
+    for p in points:
+        if not any(q.distance(p) <= tol for q in unique):
+            unique.append(p)
+    return unique
+
+random.seed(0)
+base = [Point(random.uniform(0, 100), random.uniform(0, 100), random.uniform(0, 100))
+        for _ in range(2000)]
+noisy = [Point(p.x + random.gauss(0, 1e-4), p.y, p.z) for p in base for _ in range(2)]
+
+t0 = time.perf_counter()
+slow = dedupe_pairwise(noisy, tol=1e-2)
+t1 = time.perf_counter()
+fast, mapping = dedupe(noisy, tol=1e-2)
+t2 = time.perf_counter()
+print(f'{len(noisy)} points -> {len(slow)} (pairwise, {t1-t0:.3f} s), '
+      f'{len(fast)} (spatial hash, {t2-t1:.3f} s)')
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Slots and Inheritance: Create a subclass of SlottedPoint named ColorPoint that
+   adds a color attribute.  Compare bytes_per_instance() with and without declaring
+   __slots__ = ('color',) in the subclass.
+2. Slotted Triangle: Rewrite the Triangle class from the Classes and Objects lecture
+   using __slots__ and SlottedPoint vertices.  Measure its memory per instance.
+3. Frozen Vectors: Write a FrozenVector class (any number of coordinates) with
+   __eq__ and a cached __hash__, and use a set to count the distinct Vectors in a list.
+4. Merged Coordinates: Modify dedupe() so that each unique point is placed at the
+   average position of all of the points merged into it.
+"""
@@ -0,0 +1,812 @@
+# Geometry with NumPy
+
+"""
+Topics
+------
+Indexed Triangle Meshes
+Spatial Indexing: k-d Trees and Uniform Grids
+Blocked Pairwise Distance Matrices
+"""
+
+import heapq
+import itertools
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+print()
+print('Indexed Triangle Meshes:')
+print('---------------------------------------')
+
+# In the Classes and Objects lecture, a Triangle was built by composition from
+# three Point objects:
+
+class Point:
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):      # distance to a second Point
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):           # distance from origin to the Point
+        return(self.distance(Point(0,0,0)))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+
+class Triangle:
+    def __init__(self, p1=(0,0), p2=(0,0), p3=(0,0)):
+        self.p1 = Point(p1[0],p1[1])
+        self.p2 = Point(p2[0],p2[1])
+        self.p3 = Point(p3[0],p3[1])
+    def perimeter(self):
+        return (Point.distance(self.p1, self.p2) +
+                Point.distance(self.p2, self.p3) +
+                Point.distance(self.p3, self.p1))
+
+# Engineering models (finite element meshes, CAD surfaces, 3D scans) are made of
+# thousands or millions of triangles that share their corners with neighboring
+# triangles.  Storing every triangle as three separate Point objects duplicates
+# each shared corner up to 6 times, and computing perimeters takes three
+# Python-level distance() calls per triangle.
+#
+# The standard solution is an _indexed mesh_:
+#   -- a single vertex array of shape (n, 3), one row per unique corner
+#   -- a face array of shape (m, 3) holding, for each triangle, the row numbers
+#      (indices) of its three corners in the vertex array
+#
+# NumPy "fancy indexing" with the face array, vertices[faces], then gathers the
+# corners of all m triangles at once into an (m, 3, 3) array, and every
+# geometric quantity can be computed for the whole mesh in a few array operations.
+
+class TriangleMesh:
+    """
+    Represents a mesh of triangles sharing a common vertex buffer.
+
+    Attributes:
+        vertices (ndarray): float64 array of shape (n, 3). 2D vertices are given z = 0.
+        faces (ndarray):    read-only int32 array of shape (m, 3) of vertex indices.
+
+    Methods:
+        edge_vectors():  (m, 3, 3) array of edge vectors p2-p1, p3-p2, p1-p3.
+        edge_lengths():  (m, 3) array of edge lengths.
+        perimeter():     (m,) array of triangle perimeters.
+        area():          (m,) array of triangle areas.
+        normals():       (m, 3) array of unit normal vectors.
+        unique_edges():  (k, 2) array of vertex index pairs, one row per shared edge.
+                         The result is computed once and cached.
+        from_triangles(tris): Class method to build a mesh from Triangle objects.
+    """
+    def __init__(self, vertices, faces):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] not in (2, 3):
+            raise ValueError("vertices must have shape (n, 2) or (n, 3)")
+        if vertices.shape[1] == 2:
+            vertices = np.column_stack([vertices, np.zeros(len(vertices))])
+        faces = np.array(faces, dtype=np.int32)
+        if faces.ndim != 2 or faces.shape[1] != 3:
+            raise ValueError("faces must have shape (m, 3)")
+        if faces.size and (faces.min() < 0 or faces.max() >= len(vertices)):
+            raise IndexError("face index out of range")
+        faces.flags.writeable = False    # faces never change, so caches stay valid
+        self.vertices = vertices
+        self.faces = faces
+        self._unique_edges = None
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        # Merge identical corners so that shared vertices are stored only once:
+        corners = np.array([[(t.p1.x, t.p1.y, t.p1.z),
+                             (t.p2.x, t.p2.y, t.p2.z),
+                             (t.p3.x, t.p3.y, t.p3.z)] for t in triangles],
+                           dtype=np.float64).reshape(-1, 3)
+        vertices, index = np.unique(corners, axis=0, return_inverse=True)
+        return cls(vertices, index.reshape(-1, 3))
+
+    def __len__(self):
+        return len(self.faces)
+
+    def corners(self):
+        return self.vertices[self.faces]              # shape (m, 3, 3)
+
+    def edge_vectors(self):
+        c = self.corners()
+        return np.roll(c, -1, axis=1) - c             # p2-p1, p3-p2, p1-p3
+
+    def edge_lengths(self):
+        e = self.edge_vectors()
+        return np.sqrt(np.einsum('ijk,ijk->ij', e, e))
+
+    def perimeter(self):
+        return self.edge_lengths().sum(axis=1)
+
+    def _cross(self):
+        c = self.corners()
+        return np.cross(c[:, 1] - c[:, 0], c[:, 2] - c[:, 0])
+
+    def area(self):
+        # The magnitude of the cross product of two edges is twice the area:
+        return 0.5 * np.linalg.norm(self._cross(), axis=1)
+
+    def normals(self):
+        n = self._cross()
+        length = np.linalg.norm(n, axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return n / length                         # degenerate triangles give nan
+
+    def unique_edges(self):
+        if self._unique_edges is None:
+            edges = np.stack([self.faces, np.roll(self.faces, -1, axis=1)], axis=2)
+            edges = np.sort(edges.reshape(-1, 2), axis=1)   # (a,b) and (b,a) match
+            self._unique_edges = np.unique(edges, axis=0)
+        return self._unique_edges
+
+    def unique_edge_lengths(self):
+        e = self.unique_edges()
+        d = self.vertices[e[:, 1]] - self.vertices[e[:, 0]]
+        return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+    def __str__(self):
+        return f'TriangleMesh with {len(self.vertices)} vertices and {len(self)} faces'
+
+
+# The triangle from the Classes and Objects lecture, as a one-face mesh:
+
+tri = Triangle((-2,-5), (-3,3), (0,10))
+mesh = TriangleMesh.from_triangles([tri])
+print(mesh)
+print(tri.perimeter(), mesh.perimeter())
+print('area:', mesh.area(), ' normal:', mesh.normals())
+
+
+# ---------------
+# A structured mesh
+# ---------------
+
+# Split each cell of an N x N grid covering the unit square into 2 triangles.
+# Each interior vertex is shared by 6 triangles.
+
+def grid_mesh(N):
+    x, y = np.meshgrid(np.linspace(0, 1, N+1), np.linspace(0, 1, N+1))
+    vertices = np.column_stack([x.ravel(), y.ravel()])
+    i, j = np.meshgrid(np.arange(N), np.arange(N))
+    v00 = (j*(N+1) + i).ravel()           # lower-left corner of each cell
+    v10 = v00 + 1
+    v01 = v00 + N + 1
+    v11 = v01 + 1
+    faces = np.concatenate([np.column_stack([v00, v10, v11]),
+                            np.column_stack([v00, v11, v01])])
+    return TriangleMesh(vertices, faces)
+
+mesh = grid_mesh(300)
+print(mesh)
+print('total area (should be 1):', mesh.area().sum())
+print('number of unique edges:', len(mesh.unique_edges()))
+print('longest edge:', mesh.unique_edge_lengths().max())
+
+# Compare with the same triangles stored as Triangle objects:
+
+corners = mesh.corners()
+triangles = [Triangle(c[0], c[1], c[2]) for c in corners[:, :, :2].tolist()]
+
+t0 = time.perf_counter()
+perim_objects = [t.perimeter() for t in triangles]
+t1 = time.perf_counter()
+perim_mesh = mesh.perimeter()
+t2 = time.perf_counter()
+
+print(f'Triangle objects: {t1-t0:.4f} s')
+print(f'TriangleMesh:     {t2-t1:.4f} s')
+print('results agree:', np.allclose(perim_objects, perim_mesh))
+print(f'floats stored by Triangle objects: {9*len(triangles):,}')
+print(f'floats stored by TriangleMesh:     {mesh.vertices.size:,}')
+
+
+print()
+print('Spatial Indexing: k-d Trees and Uniform Grids:')
+print('---------------------------------------')
+
+# Finding the Point closest to some location by calling distance() on every
+# candidate takes O(N) work per query, and finding the closest pair among N
+# points takes O(N^2).  A _spatial index_ organizes the points ahead of time so
+# that most of them can be ruled out without computing any distances.
+#
+# Both indexes below accept either a list of Point objects or an (n, 3) (or
+# (n, 2)) NumPy coordinate array, and refer to points by their position
+# (index) in that input.
+
+def coordinates_of(points):
+    """Return an (n, 3) float64 array of coordinates from Points or an array."""
+    if isinstance(points, np.ndarray):
+        coords = np.asarray(points, dtype=np.float64)
+    else:
+        coords = np.array([(p.x, p.y, p.z) for p in points], dtype=np.float64)
+    if coords.ndim == 1 and coords.size == 0:
+        coords = coords.reshape(0, 3)
+    if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+        raise ValueError("points must have shape (n, 2) or (n, 3)")
+    if coords.shape[1] == 2:
+        coords = np.column_stack([coords, np.zeros(len(coords))])
+    return coords
+
+def query_point(q):
+    """Return a length-3 float64 array for a Point (or Point-like object), tuple or array."""
+    if hasattr(q, 'x'):
+        return np.array([q.x, q.y, q.z], dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+    return np.append(q, 0.0) if q.shape == (2,) else q
+
+# Both indexes also accept new points after they are built.  Concatenating the
+# new points onto the coordinate array would copy all existing points on every
+# insert.  Instead, the coordinates live in a larger _buffer_ array whose unused
+# rows are filled as points arrive; when it is full, its capacity is doubled.
+# Copies then happen only log2(N) times in total, as for a Python list.
+
+def append_rows(buffer, count, new):
+    """Store new after the first count rows of buffer, growing it if needed.
+
+    Returns the (possibly new) buffer and the new row count."""
+    needed = count + len(new)
+    if needed > len(buffer):
+        bigger = np.empty((max(needed, 2*len(buffer), 16), buffer.shape[1]))
+        bigger[:count] = buffer[:count]
+        buffer = bigger
+    buffer[count:needed] = new
+    return buffer, needed
+
+
+# ---------------
+# k-d tree
+# ---------------
+
+# A k-d tree recursively splits the points in half at the median value of the
+# coordinate with the widest spread, producing a binary tree with small groups
+# of points (the _leaves_) at the bottom.  Each tree node remembers the bounding
+# box of its points.  During a search, a node is skipped entirely when its box is
+# farther away than the best answer found so far, so a query only visits about
+# log2(N) nodes instead of all N points.
+#
+# Rebuilding the tree after every new point would be expensive, so insert()
+# places new points in a small _pending_ array that is searched by brute force.
+# Once the pending array grows past a fraction of the tree size, the whole tree is
+# rebuilt, which keeps the average cost of an insert low.
+
+class KDTree:
+    """
+    k-d tree for nearest-neighbor, radius and bounding-box queries.
+
+    Attributes:
+        points (ndarray): (n, 3) array of all indexed coordinates.
+
+    Methods:
+        knn(q, k):          Returns (distances, indices) of the k points nearest q.
+        radius(q, r):       Returns the indices of all points within distance r of q.
+        box(lo, hi):        Returns the indices of all points inside the box lo <= p <= hi.
+        knn_many(Q, k):     Batch version of knn() for an (m, 3) array of queries.
+        radius_many(Q, r):  Batch version of radius(), returning a list of index arrays.
+        insert(points):     Adds new points, returning their indices.
+    """
+    def __init__(self, points, leaf_size=16, rebuild_fraction=0.25):
+        self.leaf_size = leaf_size
+        self.rebuild_fraction = rebuild_fraction
+        # Copy, so that later changes to the caller's array cannot change points:
+        self._buffer = coordinates_of(points).copy()
+        self._count = len(self._buffer)
+        self._build()
+
+    @property
+    def points(self):
+        return self._buffer[:self._count]
+
+    def __len__(self):
+        return self._count
+
+    def _build(self):
+        n = len(self.points)
+        self._index = np.arange(n)
+        self._nodes = []          # (lo, hi, box_min, box_max, left, right)
+        if n:
+            self._build_node(0, n)
+        self._sorted = self.points[self._index]   # leaf points are contiguous
+        self._n_tree = n
+
+    def _build_node(self, lo, hi):
+        idx = self._index[lo:hi]
+        pts = self.points[idx]
+        box_min, box_max = pts.min(axis=0), pts.max(axis=0)
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if hi - lo <= self.leaf_size:
+            self._nodes[node] = (lo, hi, box_min, box_max, None, None)
+            return node
+        axis = np.argmax(box_max - box_min)
+        mid = (lo + hi) // 2
+        order = np.argpartition(pts[:, axis], mid - lo)   # median split
+        self._index[lo:hi] = idx[order]
+        left = self._build_node(lo, mid)
+        right = self._build_node(mid, hi)
+        self._nodes[node] = (lo, hi, box_min, box_max, left, right)
+        return node
+
+    @staticmethod
+    def _box_distance(q, box_min, box_max):
+        # Distance from q to the nearest point of a box (0 if q is inside):
+        d = np.maximum(np.maximum(box_min - q, q - box_max), 0.0)
+        return math.sqrt(d @ d)
+
+    def insert(self, points):
+        new = coordinates_of(points)
+        start = self._count
+        self._buffer, self._count = append_rows(self._buffer, self._count, new)
+        if self._count - self._n_tree > max(self.leaf_size,
+                                            self.rebuild_fraction*self._n_tree):
+            self._build()
+        return np.arange(start, self._count)
+
+    def _pending(self):
+        return self.points[self._n_tree:], np.arange(self._n_tree, len(self.points))
+
+    def knn(self, q, k=1):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        q = query_point(q)
+        k = min(k, len(self.points))
+        best = []                 # max-heap of (-distance, index), size <= k
+        def offer(dist, idx):
+            for d, i in zip(dist.tolist(), idx.tolist()):
+                if len(best) < k:
+                    heapq.heappush(best, (-d, i))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, i))
+
+        pending, pending_idx = self._pending()
+        if len(pending):
+            offer(np.linalg.norm(pending - q, axis=1), pending_idx)
+
+        # Best-first search: always expand the closest unvisited node next
+        todo = [(0.0, 0)] if self._nodes else []
+        while todo:
+            d_box, node = heapq.heappop(todo)
+            if len(best) == k and d_box >= -best[0][0]:
+                break             # every remaining node is too far away
+            lo, hi, _, _, left, right = self._nodes[node]
+            if left is None:
+                offer(np.linalg.norm(self._sorted[lo:hi] - q, axis=1), self._index[lo:hi])
+            else:
+                for child in (left, right):
+                    _, _, cmin, cmax, _, _ = self._nodes[child]
+                    heapq.heappush(todo, (self._box_distance(q, cmin, cmax), child))
+
+        best.sort(reverse=True)   # nearest first
+        return (np.array([-d for d, i in best]), np.array([i for d, i in best], dtype=np.intp))
+
+    def radius(self, q, r):
+        q = query_point(q)
+        found = []
+        pending, pending_idx = self._pending()
+        if len(pending):
+            found.append(pending_idx[np.linalg.norm(pending - q, axis=1) <= r])
+        todo = [0] if self._nodes else []
+        while todo:
+            lo, hi, box_min, box_max, left, right = self._nodes[todo.pop()]
+            if self._box_distance(q, box_min, box_max) > r:
+                continue
+            if left is None:
+                dist = np.linalg.norm(self._sorted[lo:hi] - q, axis=1)
+                found.append(self._index[lo:hi][dist <= r])
+            else:
+                todo.extend((left, right))
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def box(self, lo_corner, hi_corner):
+        lo_corner, hi_corner = query_point(lo_corner), query_point(hi_corner)
+        def inside(pts):
+            return np.all((pts >= lo_corner) & (pts <= hi_corner), axis=1)
+        found = []
+        pending, pending_idx = self._pending()
+        if len(pending):
+            found.append(pending_idx[inside(pending)])
+        todo = [0] if self._nodes else []
+        while todo:
+            lo, hi, box_min, box_max, left, right = self._nodes[todo.pop()]
+            if np.any(box_min > hi_corner) or np.any(box_max < lo_corner):
+                continue          # node box does not overlap the query box
+            if left is None:
+                found.append(self._index[lo:hi][inside(self._sorted[lo:hi])])
+            else:
+                todo.extend((left, right))
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def knn_many(self, queries, k=1):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        queries = coordinates_of(queries)
+        k = min(k, len(self.points))
+        dist = np.empty((len(queries), k))
+        index = np.empty((len(queries), k), dtype=np.intp)
+        for row, q in enumerate(queries):
+            dist[row], index[row] = self.knn(q, k)
+        return dist, index
+
+    def radius_many(self, queries, r):
+        return [self.radius(q, r) for q in coordinates_of(queries)]
+
+
+# ---------------
+# Uniform grid
+# ---------------
+
+# When the points are spread fairly evenly and the query radius is known in
+# advance, an even simpler index works well: cover space with cubes (_cells_) of
+# a fixed size, and keep a dictionary mapping each cell to the list of points
+# that fall inside it.  A radius query only needs to look at the handful of cells
+# that overlap the search sphere.  Inserting a point is just a dictionary update
+# (plus storing its coordinates, see append_rows()).
+#
+# Only the cells that contain points are stored, so a query box that covers
+# mostly empty space (a query far outside the data, or a very large box) must not
+# step through all of its cells one by one.  The grid remembers the lowest and
+# highest occupied cell in each direction and clips the query to that range.  If
+# the clipped range still holds more cells than there are occupied cells, it is
+# cheaper to go through the occupied cells instead.
+
+class UniformGrid:
+    """
+    Uniform grid (spatial hash) for radius, bounding-box and nearest-neighbor queries.
+
+    Attributes:
+        cell_size (float): Edge length of each cubic cell.
+        points (ndarray):  (n, 3) array of all indexed coordinates.
+
+    Methods:
+        radius(q, r), box(lo, hi), knn(q, k), radius_many(Q, r), knn_many(Q, k), insert(points)
+        (same meaning as for KDTree)
+    """
+    def __init__(self, points, cell_size):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = cell_size
+        self._buffer = np.empty((0, 3))
+        self._count = 0
+        self._cells = {}
+        self._cell_min = None         # lowest and highest occupied cell
+        self._cell_max = None
+        self.insert(points)
+
+    @property
+    def points(self):
+        return self._buffer[:self._count]
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, coords):
+        return np.floor(coords / self.cell_size).astype(np.int64)
+
+    def insert(self, points):
+        new = coordinates_of(points)
+        start = self._count
+        self._buffer, self._count = append_rows(self._buffer, self._count, new)
+        if len(new):
+            cells = self._cell(new)
+            if self._cell_min is None:
+                self._cell_min, self._cell_max = cells.min(axis=0), cells.max(axis=0)
+            else:
+                self._cell_min = np.minimum(self._cell_min, cells.min(axis=0))
+                self._cell_max = np.maximum(self._cell_max, cells.max(axis=0))
+            for i, key in enumerate(map(tuple, cells.tolist()), start):
+                self._cells.setdefault(key, []).append(i)
+        return np.arange(start, self._count)
+
+    def _candidates(self, lo_corner, hi_corner):
+        # Indices of all points in the cells overlapping the box lo..hi:
+        if self._cell_min is None:
+            return np.empty(0, dtype=np.intp)
+        lo_cell = np.maximum(self._cell(lo_corner), self._cell_min).tolist()
+        hi_cell = np.minimum(self._cell(hi_corner), self._cell_max).tolist()
+        if any(a > b for a, b in zip(lo_cell, hi_cell)):
+            return np.empty(0, dtype=np.intp)
+        found = []
+        if math.prod(b - a + 1 for a, b in zip(lo_cell, hi_cell)) > len(self._cells):
+            for key, members in self._cells.items():
+                if all(a <= c <= b for a, c, b in zip(lo_cell, key, hi_cell)):
+                    found.extend(members)
+        else:
+            for key in itertools.product(*(range(a, b+1) for a, b in zip(lo_cell, hi_cell))):
+                found.extend(self._cells.get(key, ()))
+        return np.array(found, dtype=np.intp)
+
+    def radius(self, q, r):
+        q = query_point(q)
+        idx = self._candidates(q - r, q + r)
+        if len(idx) == 0:
+            return idx
+        return idx[np.linalg.norm(self.points[idx] - q, axis=1) <= r]
+
+    def box(self, lo_corner, hi_corner):
+        lo_corner, hi_corner = query_point(lo_corner), query_point(hi_corner)
+        idx = self._candidates(lo_corner, hi_corner)
+        if len(idx) == 0:
+            return idx
+        pts = self.points[idx]
+        return idx[np.all((pts >= lo_corner) & (pts <= hi_corner), axis=1)]
+
+    def knn(self, q, k=1):
+        # Search a growing radius until it holds at least k points.  A sphere
+        # reaching the farthest corner of the occupied cells holds every point,
+        # so the search stops there at the latest:
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        q = query_point(q)
+        if not np.all(np.isfinite(q)):
+            raise ValueError("query point must have finite coordinates")
+        k = min(k, len(self.points))
+        if k == 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        lo = self._cell_min * self.cell_size
+        hi = (self._cell_max + 1) * self.cell_size
+        farthest = np.linalg.norm(np.maximum(np.abs(q - lo), np.abs(q - hi)))
+        r = self.cell_size
+        while True:
+            idx = self.radius(q, min(r, farthest))
+            if len(idx) >= k or r >= farthest:
+                break
+            r *= 2
+        dist = np.linalg.norm(self.points[idx] - q, axis=1)
+        nearest = np.argsort(dist)[:k]
+        return dist[nearest], idx[nearest]
+
+    def knn_many(self, queries, k=1):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        queries = coordinates_of(queries)
+        k = min(k, len(self.points))
+        dist = np.empty((len(queries), k))
+        index = np.empty((len(queries), k), dtype=np.intp)
+        for row, q in enumerate(queries):
+            dist[row], index[row] = self.knn(q, k)
+        return dist, index
+
+    def radius_many(self, queries, r):
+        return [self.radius(q, r) for q in coordinates_of(queries)]
+
+
+# Index the four Points from the Classes and Objects lecture:
+
+points = [Point(10, 4, 6), Point(-8, 7, 14), Point(), Point(y=3)]
+tree = KDTree(points)
+grid = UniformGrid(points, cell_size=5.0)
+print('closest 2 points to (1,1,1):', tree.knn((1, 1, 1), k=2))
+print('same, using the grid:       ', grid.knn((1, 1, 1), k=2))
+print('points within 5 of origin:', tree.radius(Point(), 5), grid.radius(Point(), 5))
+
+# Now a larger random point set.  Compare against brute force with distance():
+
+n = 100_000
+rng = np.random.default_rng(1)
+coords = rng.uniform(0, 100, size=(n, 3))
+point_list = [Point(*c) for c in coords.tolist()]
+
+t0 = time.perf_counter()
+tree = KDTree(coords)
+t1 = time.perf_counter()
+grid = UniformGrid(coords, cell_size=2.0)
+t2 = time.perf_counter()
+print(f'build k-d tree: {t1-t0:.3f} s,  build grid: {t2-t1:.3f} s')
+
+target = Point(50, 50, 50)
+t0 = time.perf_counter()
+closest = min(range(n), key=lambda i: point_list[i].distance(target))
+t1 = time.perf_counter()
+d, i = tree.knn(target, k=1)
+t2 = time.perf_counter()
+print(f'brute force: point {closest} in {t1-t0:.4f} s')
+print(f'k-d tree:    point {i[0]} in {t2-t1:.4f} s')
+
+queries = rng.uniform(0, 100, size=(1000, 3))
+t0 = time.perf_counter()
+d_tree, i_tree = tree.knn_many(queries, k=5)
+t1 = time.perf_counter()
+d_grid, i_grid = grid.knn_many(queries, k=5)
+t2 = time.perf_counter()
+print(f'1000 5-nearest queries: k-d tree {t1-t0:.3f} s, grid {t2-t1:.3f} s')
+print('tree and grid agree:', np.allclose(d_tree, d_grid))
+
+inside = tree.box((10, 10, 10), (20, 20, 20))
+print('points in box:', len(inside), len(grid.box((10, 10, 10), (20, 20, 20))))
+
+# Insert new points without rebuilding from scratch each time:
+for _ in range(10):
+    tree.insert(rng.uniform(0, 100, size=(100, 3)))
+print('points after inserts:', len(tree))
+
+
+print()
+print('Blocked Pairwise Distance Matrices:')
+print('---------------------------------------')
+
+# Many engineering calculations need the distance between _every_ pair of points
+# (e.g. radiation view factors, interaction forces, clustering).  For N points
+# that is N^2 distances.  Filling the table with Point.distance() takes N^2
+# Python function calls:
+
+def distance_table(points):
+    return [[p.distance(q) for q in points] for p in points]
+
+# NumPy broadcasting can do the same job with no Python loop:
+#
+#     diff = coords[:, None, :] - coords[None, :, :]     # shape (N, N, 3)
+#     D = np.sqrt((diff**2).sum(axis=2))
+#
+# but the temporary diff array holds 3*N^2 floats.  For N = 50,000 points that is
+# 60 GB, far more memory than a typical computer has.
+#
+# The solution is to _tile_ (or _block_) the computation: split the N x N table
+# into square blocks that are small enough to fit comfortably in memory (and in
+# the CPU cache), and compute one block at a time.  Within a block we add up the
+# squared x, y and z differences one coordinate at a time, reusing the same two
+# scratch arrays, so no (N, N, 3) temporary is ever created.
+#
+# The blocks are independent of each other, so they can be computed in parallel
+# by a _thread pool_ (NumPy releases Python's global interpreter lock while it
+# does arithmetic, so threads really do run at the same time).  Each block writes
+# into its own region of the output array, which may also be a _memory-mapped_
+# file (np.memmap) when the full table is too large for memory.
+
+def pairwise_distances(points, others=None, block_size=None, max_memory=64*2**20,
+                       out=None, upper=False, threshold=None, workers=None):
+    """
+    Compute distances between all pairs of points, one block at a time.
+
+    Parameters:
+        points:     list of Points or (n, 3) array.
+        others:     optional second set of m points (default: points itself).
+        block_size: rows/columns per block.  By default chosen so that the scratch
+                    arrays of all worker threads fit within max_memory bytes.
+        out:        optional float64 array or np.memmap to fill: shape (n, m), or
+                    (n*(n-1)/2,) when upper=True.  Not allowed with threshold.
+        upper:      if True (and others is None), only pairs i < j are computed and
+                    a condensed 1D array of the n*(n-1)/2 upper-triangle distances
+                    is returned, ordered (0,1), (0,2), ..., (1,2), ...
+        threshold:  if given, only pairs closer than threshold are kept, returned
+                    as sparse (rows, cols, distances) arrays.
+        workers:    number of threads (default: number of CPUs).
+
+    Returns:
+        The (n, m) distance matrix, the condensed upper triangle, or the sparse
+        (rows, cols, distances) triplets, depending on upper and threshold.
+    """
+    a = coordinates_of(points)
+    b = a if others is None else coordinates_of(others)
+    n, m = len(a), len(b)
+    if upper and others is not None:
+        raise ValueError("upper=True requires a single set of points")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if block_size is None:
+        # two float64 scratch blocks per worker thread:
+        block_size = max(16, int(math.sqrt(max_memory / (2 * 8 * workers))))
+
+    dense = threshold is None and not upper
+    if threshold is not None:
+        if out is not None:
+            raise ValueError("out cannot be used with threshold (the result is sparse)")
+    else:
+        shape = (n, m) if dense else (n*(n-1)//2,)
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape:
+            raise ValueError(f"out must have shape {shape}")
+
+    a_cols = [np.ascontiguousarray(a[:, k]) for k in range(3)]
+    b_cols = [np.ascontiguousarray(b[:, k]) for k in range(3)]
+
+    def compute_block(i0, i1, j0, j1):
+        tile = np.zeros((i1-i0, j1-j0))
+        scratch = np.empty_like(tile)
+        for ak, bk in zip(a_cols, b_cols):
+            np.subtract(ak[i0:i1, None], bk[None, j0:j1], out=scratch)
+            np.square(scratch, out=scratch)
+            tile += scratch
+        return np.sqrt(tile, out=tile)
+
+    def work(i0, j0):
+        i1, j1 = min(i0 + block_size, n), min(j0 + block_size, m)
+        tile = compute_block(i0, i1, j0, j1)
+        if dense:
+            out[i0:i1, j0:j1] = tile
+            return None
+        if threshold is not None:
+            rows, cols = np.nonzero(tile <= threshold)
+            rows += i0
+            cols += j0
+            if upper:
+                keep = rows < cols
+                rows, cols = rows[keep], cols[keep]
+            return rows, cols, tile[rows - i0, cols - j0]
+        # Condensed upper triangle: row i holds columns i+1..n-1 starting at
+        # position i*n - i*(i+1)/2 in the output.
+        for i in range(i0, i1):
+            start = max(j0, i + 1)
+            if start < j1:
+                offset = i*n - i*(i+1)//2 - (i+1)
+                out[offset+start:offset+j1] = tile[i-i0, start-j0:]
+        return None
+
+    tiles = [(i0, j0) for i0 in range(0, n, block_size)
+                      for j0 in range(0, m, block_size)
+                      if not upper or j0 + block_size > i0 + 1]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda t: work(*t), tiles))
+
+    if threshold is None:
+        return out
+    results = [r for r in results if r is not None]
+    if not results:
+        return (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+    rows, cols, dist = (np.concatenate(parts) for parts in zip(*results))
+    return rows, cols, dist
+
+
+# Check against distance_table() for a small set of Points:
+
+points = [Point(10, 4, 6), Point(-8, 7, 14), Point(), Point(y=3)]
+print(np.array(distance_table(points)))
+print(pairwise_distances(points, block_size=2))
+print('upper triangle:', pairwise_distances(points, upper=True))
+print('pairs closer than 13:', pairwise_distances(points, upper=True, threshold=13))
+
+# Timing for 2000 points:
+
+coords = rng.uniform(0, 100, size=(2000, 3))
+point_list = [Point(*c) for c in coords.tolist()]
+
+t0 = time.perf_counter()
+D_loop = distance_table(point_list)
+t1 = time.perf_counter()
+D_block = pairwise_distances(coords)
+t2 = time.perf_counter()
+print(f'distance() loops:     {t1-t0:.3f} s')
+print(f'pairwise_distances(): {t2-t1:.3f} s')
+print('results agree:', np.allclose(D_loop, D_block))
+
+# A larger table written straight to a memory-mapped file on disk.  Only the
+# blocks currently being computed are held in memory:
+
+coords = rng.uniform(0, 100, size=(5000, 3))
+with tempfile.TemporaryDirectory() as folder:
+    path = os.path.join(folder, 'distances.npy')
+    D = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+                                  shape=(len(coords), len(coords)))
+    t0 = time.perf_counter()
+    pairwise_distances(coords, out=D, max_memory=16*2**20)
+    D.flush()
+    t1 = time.perf_counter()
+    print(f'{D.shape} table written to disk in {t1-t0:.3f} s ({os.path.getsize(path)/2**20:.0f} MB)')
+    print('D[123, 4567] =', D[123, 4567], ' check:', np.linalg.norm(coords[123] - coords[4567]))
+    del D
+
+# Often only the close pairs matter.  The sparse threshold mode never stores
+# the full table at all:
+
+rows, cols, dist = pairwise_distances(coords, upper=True, threshold=1.0)
+print(f'{len(dist)} pairs closer than 1.0 out of {len(coords)*(len(coords)-1)//2:,}')
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Mesh Centroids: Add a centroids() method to TriangleMesh that returns an (m, 3)
+   array holding the centroid (average of the 3 corners) of every triangle.
+2. Boundary Edges: An edge on the boundary of a mesh belongs to only one triangle.
+   Use np.unique(..., return_counts=True) to find the boundary edges of grid_mesh(4).
+3. Closest Pair: Use KDTree.knn_many() with k=2 to find the closest pair of points
+   in a random set of 10,000 points.  (Why k=2 rather than k=1?)
+4. Block Size: Time pairwise_distances() on 5000 points with block_size values of
+   16, 64, 256, 1024 and 5000.  Explain why the fastest block size is neither the
+   smallest nor the largest.
+"""
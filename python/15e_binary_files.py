@@ -0,0 +1,364 @@
+# Binary Files for Points and Vectors
+
+"""
+Topics
+------
+Text vs Binary Storage
+A Binary Container Format
+Memory-Mapped Files
+Appending and Checksums
+"""
+
+import csv
+import json
+import os
+import struct
+import time
+import zlib
+import numpy as np
+
+
+print()
+print('Text vs Binary Storage:')
+print('---------------------------------------')
+
+# In the File Handling lecture we saved data as JSON and CSV text.  Text files
+# are easy to read by eye, but every number must be converted to a string of
+# digits when writing and parsed back when reading.  A float64 value occupies
+# 8 bytes in memory, but as text it typically needs 18-25 characters, and
+# parsing text is slow.
+#
+# A _binary_ file stores the raw bytes of each number exactly as they sit in
+# memory.  This is compact and fast, and it lets us jump directly to the i-th
+# value in the file without reading everything in front of it.
+
+class Point:
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):      # distance to a second Point
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    def length(self):           # distance from origin to the Point
+        return(self.distance(Point(0,0,0)))
+    def stringify(self):
+        return(f'({self.x},{self.y},{self.z})')
+
+class Vector:
+    """n-dimensional vector"""
+    def __init__(self, *args):
+        self.coordinates = args
+    def __str__(self):
+        return f'{len(self.coordinates)}-D vector: {self.coordinates}'
+
+os.makedirs('files', exist_ok=True)
+
+rng = np.random.default_rng(0)
+xyz = rng.uniform(-100, 100, size=(200_000, 3))
+
+t0 = time.perf_counter()
+with open('files/points.csv', 'w', newline='') as f:
+    csv.writer(f).writerows(xyz.tolist())
+t1 = time.perf_counter()
+with open('files/points.json', 'w') as f:
+    json.dump(xyz.tolist(), f)
+t2 = time.perf_counter()
+with open('files/points.raw', 'wb') as f:      # 'b' opens the file in binary mode
+    f.write(xyz.tobytes())
+t3 = time.perf_counter()
+
+print(f'CSV:    {os.path.getsize("files/points.csv"):>10,} bytes  {t1-t0:.3f} s')
+print(f'JSON:   {os.path.getsize("files/points.json"):>10,} bytes  {t2-t1:.3f} s')
+print(f'binary: {os.path.getsize("files/points.raw"):>10,} bytes  {t3-t2:.3f} s')
+
+# The weakness of the raw binary file above is that it contains _only_ numbers.
+# Nothing in the file says whether they are float64 or float32, how many values
+# make up one point, or whether the file was cut short by a failed copy.
+
+
+print()
+print('A Binary Container Format:')
+print('---------------------------------------')
+
+# Real binary formats begin with a fixed-size _header_ that describes the data
+# that follows (the _body_).  Our format uses a 32-byte header:
+#
+#   offset  size  type     field
+#        0     4  bytes    magic number b'PTS1' identifying the file type
+#        4     2  uint16   format version
+#        6     1  char     value type: b'f' (float32) or b'd' (float64)
+#        7     1           padding
+#        8     4  uint32   dimension (values per record: 3 for a Point)
+#       12     8  uint64   count (number of records)
+#       20     4  uint32   CRC-32 checksum of the body
+#       24     8           reserved (padding, so the body starts on a multiple of 8)
+#
+# The built-in struct module converts between Python values and packed bytes.
+# Its format string '<4sHcxIQI8x' describes the layout above: '<' means
+# _little-endian_ byte order (least significant byte first, as used by nearly
+# all modern CPUs), 4s is a 4-byte string, H/I/Q are 2/4/8-byte unsigned
+# integers, c is one character, and x is a padding byte.
+#
+# The body follows the header: count*dimension little-endian floats, one record
+# after another.
+
+HEADER = struct.Struct('<4sHcxIQI8x')
+MAGIC = b'PTS1'
+VERSION = 1
+DTYPES = {b'f': np.dtype('<f4'), b'd': np.dtype('<f8')}
+
+def records_of(items, dim=None):
+    """Return a 2D array of records from Points, Vectors or an array."""
+    if isinstance(items, np.ndarray):
+        data = items
+    else:
+        items = list(items)
+        if items and isinstance(items[0], Point):
+            data = np.array([(p.x, p.y, p.z) for p in items], dtype=np.float64)
+        else:
+            data = np.array([v.coordinates for v in items], dtype=np.float64)
+    if data.ndim == 1 and data.size == 0:
+        data = data.reshape(0, dim or 3)
+    if data.ndim != 2:
+        raise ValueError("records must form a 2D array")
+    if dim is not None and data.shape[1] != dim:
+        raise ValueError(f"records must have dimension {dim}")
+    return data
+
+def write_points(path, items, dtype='d'):
+    """
+    Write Points, Vectors or an (n, dim) array to a new binary point file.
+
+    Parameters:
+        path:  file name
+        items: list of Points, list of Vectors (all the same length) or 2D array
+        dtype: 'd' for float64 (default) or 'f' for float32
+    """
+    code = dtype.encode()
+    if code not in DTYPES:
+        raise ValueError("dtype must be 'f' or 'd'")
+    data = records_of(items)
+    body = np.ascontiguousarray(data, dtype=DTYPES[code])
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, code, body.shape[1], body.shape[0],
+                            zlib.crc32(body)))
+        f.write(body)
+
+def read_header(f):
+    """Read and check the header at the start of an open binary file."""
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("file is too short to be a point file")
+    magic, version, code, dim, count, checksum = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("not a point file")
+    if version != VERSION:
+        raise ValueError(f"unsupported point file version {version}")
+    if code not in DTYPES:
+        raise ValueError("unknown value type in point file")
+    return DTYPES[code], dim, count, checksum
+
+write_points('files/points.bin', xyz)
+with open('files/points.bin', 'rb') as f:
+    print(read_header(f))
+
+# Points and Vectors can be written directly:
+
+write_points('files/few_points.bin', [Point(10, 4, 6), Point(-8, 7, 14), Point()])
+write_points('files/vectors.bin', [Vector(1, 2, 3, 4), Vector(5, 6, 7, 8)], dtype='f')
+with open('files/vectors.bin', 'rb') as f:
+    print(read_header(f))
+
+
+print()
+print('Memory-Mapped Files:')
+print('---------------------------------------')
+
+# Reading an entire multi-gigabyte file into memory just to look at a few
+# points is wasteful.  A _memory-mapped_ file (built-in mmap module) instead asks
+# the operating system to make the file appear as if it were already in memory.
+# Only the parts of the file we actually touch are read from disk, on demand.
+#
+# np.memmap wraps mmap as a NumPy array, so all of the usual array operations
+# work on a file that never gets loaded in full.  The offset argument skips over
+# the header.
+#
+# The records are always mapped read-only, even for a file opened with
+# mode='r+'.  If records could be changed in place, the checksum stored in the
+# header would silently go out of date; instead, append() is the only way to
+# write, and it keeps the checksum up to date.
+
+class PointFile:
+    """
+    A binary point file opened as a memory-mapped array.
+
+    Attributes:
+        path (str):           file name
+        dtype (np.dtype):     value type ('<f4' or '<f8')
+        dim (int):            values per record
+        records (np.memmap):  (count, dim) read-only array view of the file body
+        closed (bool):        True once close() has been called
+
+    Methods:
+        points(start, stop):  Returns a list of Point objects for records start..stop-1
+        vectors(start, stop): Returns a list of Vector objects for records start..stop-1
+        append(items):        Adds records to the end of the file and updates the header
+        verify():             Returns True if the body matches the stored checksum
+        close():              Releases the memory map
+    """
+    def __init__(self, path, mode='r'):
+        # mode='r+' allows append(); the records themselves are never writable
+        if mode not in ('r', 'r+'):
+            raise ValueError("mode must be 'r' or 'r+'")
+        self.path = path
+        self.mode = mode
+        self.closed = False
+        with open(path, 'rb') as f:
+            self.dtype, self.dim, count, self._checksum = read_header(f)
+        expected = HEADER.size + count*self.dim*self.dtype.itemsize
+        if os.path.getsize(path) < expected:
+            raise ValueError("point file is truncated")
+        self._map(count)
+
+    def _map(self, count):
+        self._count = count     # kept separately, since close() drops the map
+        if count == 0:          # mmap cannot map zero bytes
+            self.records = np.empty((0, self.dim), dtype=self.dtype)
+        else:
+            self.records = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                     offset=HEADER.size, shape=(count, self.dim))
+
+    def __len__(self):
+        return self._count
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed point file")
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def points(self, start=0, stop=None):
+        if self.dim != 3:
+            raise ValueError("only 3D records can be read as Points")
+        return [Point(x, y, z) for x, y, z in self.records[start:stop].tolist()]
+
+    def vectors(self, start=0, stop=None):
+        return [Vector(*row) for row in self.records[start:stop].tolist()]
+
+    def verify(self, block=1 << 16):
+        self._check_open()
+        # Recompute the checksum a block of records at a time:
+        crc = 0
+        for i in range(0, len(self), block):
+            crc = zlib.crc32(np.ascontiguousarray(self.records[i:i+block]), crc)
+        return crc == self._checksum
+
+    def append(self, items):
+        self._check_open()
+        if self.mode != 'r+':
+            raise ValueError("file must be opened with mode='r+' to append")
+        body = np.ascontiguousarray(records_of(items, self.dim), dtype=self.dtype)
+        count = len(self) + len(body)
+        # CRC-32 can be updated by continuing from the previous value, so only
+        # the new records need to be read:
+        checksum = zlib.crc32(body, self._checksum)
+        self.records = None     # release the map before the file changes size
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER.size + (count - len(body))*self.dim*self.dtype.itemsize)
+            f.write(body)
+            f.truncate()
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, self._code(), self.dim, count, checksum))
+        self._checksum = checksum
+        self._map(count)
+
+    def _code(self):
+        return next(code for code, dt in DTYPES.items() if dt == self.dtype)
+
+    def close(self):
+        # The map is released once no array refers to it any more:
+        self.records = np.empty((0, self.dim), dtype=self.dtype)
+        self.closed = True
+
+    # Support "with PointFile(...) as pf:", as with open():
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+with PointFile('files/points.bin') as pf:
+    print(len(pf), 'records of dimension', pf.dim)
+    print('record 12345:', pf[12345])
+
+    # Find the points inside a box, scanning the file in blocks:
+    inside = 0
+    for i in range(0, len(pf), 50_000):
+        block = pf[i:i+50_000]
+        inside += np.count_nonzero(np.all(np.abs(block) < 10, axis=1))
+    print('points within the box |x|,|y|,|z| < 10:', inside)
+
+    for p in pf.points(0, 3):
+        print(p.stringify())
+
+with PointFile('files/vectors.bin') as vf:
+    for v in vf.vectors():
+        print(v)
+
+# Compare the time to load the file contents from CSV and from the binary file:
+
+t0 = time.perf_counter()
+with open('files/points.csv') as f:
+    from_csv = np.array([[float(v) for v in row] for row in csv.reader(f)])
+t1 = time.perf_counter()
+with PointFile('files/points.bin') as pf:
+    from_bin = np.array(pf.records)
+t2 = time.perf_counter()
+print(f'load from CSV:    {t1-t0:.3f} s')
+print(f'load from binary: {t2-t1:.3f} s')
+print('identical values:', np.array_equal(from_csv, from_bin))
+
+
+print()
+print('Appending and Checksums:')
+print('---------------------------------------')
+
+# A _checksum_ is a short number computed from every byte of the data.  If even
+# one bit of the body changes (a bad disk sector, an interrupted copy), the
+# checksum no longer matches.  The built-in zlib.crc32() function computes the
+# widely used CRC-32 checksum.
+
+with PointFile('files/few_points.bin', mode='r+') as pf:
+    pf.append([Point(0, 3, 0), Point(1, 1, 1)])
+    print(len(pf), 'points, checksum ok:', pf.verify())
+    print([p.stringify() for p in pf.points()])
+    try:
+        pf[0][0] = 5.0                # records cannot be changed in place
+    except ValueError as err:
+        print('ValueError:', err)
+try:
+    pf.append([Point()])              # the with block has closed the file
+except ValueError as err:
+    print('ValueError:', err)
+
+# Now corrupt one byte in the body of the file on purpose and check again:
+
+with open('files/few_points.bin', 'r+b') as f:
+    f.seek(HEADER.size + 5)
+    f.write(b'\xff')
+with PointFile('files/few_points.bin') as pf:
+    print('checksum ok after corruption:', pf.verify())
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. File Size: Using HEADER.size and the header fields, write a function that
+   predicts the size in bytes of a point file before it is written.  Check your
+   answer with os.path.getsize().
+2. float32 Savings: Write the same 200,000 points with dtype='f' and dtype='d'.
+   Compare the file sizes and the largest rounding error introduced by float32.
+3. Header Check: What happens if you open files/points.csv with PointFile?
+   Use a try/except block to print a friendly error message instead.
+"""
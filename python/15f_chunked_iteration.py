@@ -0,0 +1,428 @@
+# Chunked Iteration
+
+"""
+Topics
+------
+The Cost of One Value per Call
+A Chunked Iteration Protocol
+Adapters for for Loops and sum()
+Ragged Columnar Storage for Variable-Length Tuples
+"""
+
+import abc
+import itertools
+import time
+import numpy as np
+
+
+print()
+print('The Cost of One Value per Call:')
+print('---------------------------------------')
+
+# In the Classes and Objects lecture we made classes iterable with __iter__, and
+# made iterators by defining __next__.  Each value handed to a for loop costs a
+# Python method call, and the end of the data is signalled by raising (and
+# catching) a StopIteration exception.  For a few thousand values that is
+# invisible, but for hundreds of millions of values the per-item overhead is
+# often larger than the work done with each value.
+
+class CountDownIterator:
+    def __init__(self, max):
+        self.current = max
+    def __iter__(self):
+        return self
+    def __next__(self):
+        if self.current <0:
+            raise StopIteration
+        self.current -= 1
+        return self.current+1
+
+n = 2_000_000
+t0 = time.perf_counter()
+total = sum(CountDownIterator(n))
+t1 = time.perf_counter()
+print(f'sum(CountDownIterator({n:,})) = {total:,}  in {t1-t0:.3f} s')
+
+# A common remedy is _chunking_ (also called _batching_): hand out values a
+# block at a time, as a NumPy array or a list slice, so that the Python-level
+# overhead is paid once per block rather than once per value.
+
+
+print()
+print('A Chunked Iteration Protocol:')
+print('---------------------------------------')
+
+# We add two optional methods to our iterable classes:
+#
+#     next_chunk(n)    (iterators only) return the next block of up to n values,
+#                      raising StopIteration when no values remain, just as
+#                      __next__ does for a single value
+#     iter_chunks(n)   return an iterator over blocks of up to n values
+#
+# Classes that provide iter_chunks() inherit from the Chunked base class below.
+# Its __iter__ method builds the ordinary one-value-at-a-time iteration on top of
+# the chunks: each block is converted to a list with tolist() and the values are
+# handed out by itertools.chain, all of which runs in C.  Existing for loops
+# therefore use the chunked path without any change.
+#
+# Chunked is an _abstract base class_ (built-in abc module): iter_chunks() is
+# marked with @abc.abstractmethod, so a subclass that forgets to define it
+# raises a TypeError as soon as we try to create an instance, rather than
+# failing later in the middle of a loop.
+#
+# A block size below 1 makes no sense: next_chunk(0) would return an empty block
+# without moving forward, and a loop over iter_chunks(0) would never end.  Every
+# method that takes n therefore checks it first with check_chunk_size().
+
+def check_chunk_size(n):
+    """Raise ValueError unless the block size n is at least 1."""
+    if n < 1:
+        raise ValueError("chunk size must be at least 1")
+
+class Chunked(abc.ABC):
+    """
+    Base class for iterables that produce their values in blocks.
+
+    Subclasses define iter_chunks(n), returning an iterator over NumPy arrays
+    (or lists) of up to n values each.
+
+    Attributes:
+        chunk_size (int): block size used by __iter__.
+    """
+    chunk_size = 4096
+
+    @abc.abstractmethod
+    def iter_chunks(self, n):
+        """Return an iterator over blocks of up to n values."""
+
+    def __iter__(self):
+        blocks = self.iter_chunks(self.chunk_size)
+        return itertools.chain.from_iterable(
+            block.tolist() if isinstance(block, np.ndarray) else block for block in blocks)
+
+
+# CountDown, as in the lecture, counts down from max to 0.  Each chunk is a
+# descending np.arange() block:
+
+class CountDown(Chunked):
+    def __init__(self, max):
+        self.max = max
+
+    def iter_chunks(self, n):
+        check_chunk_size(n)
+        for start in range(self.max, -1, -n):
+            yield np.arange(start, max(start - n, -1), -1)
+
+# The iterator version keeps its position in self.current, so next_chunk() and
+# __next__ can be mixed freely.  Note that an iterator's __iter__ must still return
+# the iterator itself, so CountDownIterator does not inherit Chunked.__iter__.
+
+class CountDownIterator:
+    def __init__(self, max):
+        self.current = max
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.current <0:
+            raise StopIteration
+        self.current -= 1
+        return self.current+1
+
+    def next_chunk(self, n):
+        check_chunk_size(n)
+        if self.current < 0:
+            raise StopIteration
+        stop = max(self.current - n, -1)
+        block = np.arange(self.current, stop, -1)
+        self.current = stop
+        return block
+
+    def iter_chunks(self, n):
+        check_chunk_size(n)
+        while self.current >= 0:
+            yield self.next_chunk(n)
+
+# ListOfTuples hands out the second element of each tuple.  Since those values
+# can be of any type, a chunk is a plain list built from a slice of the tuples
+# (a NumPy array would convert mixed values to a single common type):
+
+class ListOfTuples(Chunked):
+    def __init__(self, vals):
+        self.vals = vals
+
+    def iter_chunks(self, n):
+        check_chunk_size(n)
+        for i in range(0, len(self.vals), n):
+            yield [item[1] for item in self.vals[i:i+n]]
+
+for block in CountDown(10).iter_chunks(4):
+    print(block)
+
+counter = CountDownIterator(10)
+print('first value:', next(counter))
+print('next chunk: ', counter.next_chunk(4))
+print('remaining:  ', list(counter))
+try:
+    counter.next_chunk(0)
+except ValueError as e:
+    print('ValueError:', e)
+
+data = [(1, 'a', 9, 'x'), (2, 'b'), (3, 'c', 7)]
+for entry in ListOfTuples(data):
+    print(entry)
+print(list(ListOfTuples(data).iter_chunks(2)))
+
+
+print()
+print('Adapters for for Loops and sum():')
+print('---------------------------------------')
+
+# Code that receives an arbitrary iterable does not know whether it supports
+# chunks.  The adapter functions below use iter_chunks() when it is available
+# and otherwise group the values themselves with itertools.islice(), so they
+# work with any iterable (lists, generators, files, ...).
+
+def chunks(iterable, n=4096):
+    """Return an iterator over blocks of up to n values from any iterable."""
+    check_chunk_size(n)         # here too, since generators only check when started
+    if hasattr(iterable, 'iter_chunks'):
+        return iterable.iter_chunks(n)
+    def batches():
+        it = iter(iterable)
+        while True:
+            block = list(itertools.islice(it, n))
+            if not block:
+                return
+            yield block
+    return batches()
+
+def chunked_sum(iterable, n=4096):
+    """sum() replacement that adds whole NumPy blocks at a time when possible."""
+    total = 0
+    for block in chunks(iterable, n):
+        if not isinstance(block, np.ndarray):
+            total += sum(block)
+        elif block.dtype.kind in 'biu' and len(block):
+            # An int64 sum wraps around on overflow, while sum() gives an exact
+            # Python int.  Use NumPy only when the block sum cannot overflow:
+            largest = max(abs(int(block.min())), abs(int(block.max())))
+            if largest * len(block) < 2**63:
+                total += int(block.sum())
+            else:
+                total += sum(block.tolist())
+        else:
+            total += block.sum()
+    return total
+
+def values(iterable, n=4096):
+    """One-value-at-a-time iterator for a for loop, driven by the chunks."""
+    return itertools.chain.from_iterable(
+        block.tolist() if isinstance(block, np.ndarray) else block
+        for block in chunks(iterable, n))
+
+print(chunked_sum(CountDown(100)), sum(range(101)))
+print(chunked_sum(x**2 for x in range(10)))       # plain generator: batched fallback
+print([v for v in values(CountDownIterator(5), 2)])
+
+# Timing for the same 2,000,000-value count down:
+
+t0 = time.perf_counter()
+total_builtin = sum(CountDownIterator(n))
+t1 = time.perf_counter()
+total_chunked = chunked_sum(CountDownIterator(n))
+t2 = time.perf_counter()
+loop_total = 0
+for v in CountDown(n):      # for loop over the chunked __iter__
+    loop_total += v
+t3 = time.perf_counter()
+loop_total_old = 0
+for v in CountDownIterator(n):
+    loop_total_old += v
+t4 = time.perf_counter()
+
+print(f'sum() over __next__:        {t1-t0:.3f} s')
+print(f'chunked_sum():              {t2-t1:.3f} s')
+print(f'for loop over __next__:     {t4-t3:.3f} s')
+print(f'for loop over chunks:       {t3-t2:.3f} s')
+print('results agree:', total_builtin == total_chunked == loop_total == loop_total_old)
+
+
+print()
+print('Ragged Columnar Storage for Variable-Length Tuples:')
+print('---------------------------------------')
+
+# ListOfTuples keeps a plain list of tuples of different lengths, such as
+# (1, 'a', 9, 'x'), (2, 'b') and (3, 'c', 7).  Getting "the second element of
+# every tuple" means visiting every tuple in Python.  With millions of records,
+# this (and filtering records by the value at some position) becomes slow.
+#
+# A _ragged_ (or _jagged_) array stores rows of different lengths.  Here we
+# combine that idea with columnar storage:
+#   -- lengths[i] is the length of tuple i
+#   -- columns[j] is a typed NumPy array holding position j of every tuple that is
+#      long enough to have a position j (bool, int64, float64 and str values get
+#      their own dtypes; mixed types fall back to dtype=object, so that tolist()
+#      gives back exactly the values that went in: a column mixing 1 and 2.5
+#      stays [1, 2.5] rather than becoming [1.0, 2.5])
+#   -- rows[j] holds the tuple number of each entry in columns[j], in increasing
+#      order, so the entry for tuple i is found with np.searchsorted(rows[j], i)
+#
+# Extracting a position is then just returning columns[j] (no copy), and a filter
+# on one position is a single vectorized comparison.
+
+def typed_array(values):
+    """Return values as a bool, int64, float64, str or (if mixed) object array."""
+    types = set(map(type, values))
+    try:
+        if types == {bool}:
+            return np.array(values, dtype=bool)
+        if types == {int}:
+            return np.array(values, dtype=np.int64)
+        if types == {float}:
+            return np.array(values, dtype=np.float64)
+    except OverflowError:       # Python ints too large for int64
+        pass
+    if types == {str}:
+        return np.array(values, dtype=str)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+class RaggedTuples(Chunked):
+    """
+    Columnar storage for a list of variable-length tuples.
+
+    Attributes:
+        lengths (ndarray): int64 length of each tuple.
+        columns (list):    columns[j] is a typed array of the values at position j.
+        rows (list):       rows[j] is the int64 array of tuple numbers for columns[j].
+
+    Methods:
+        column(j):         Values at position j (shared, not copied).
+        where(j, test):    Tuple numbers whose position-j value passes test(column) -> mask.
+        take(indices):     New RaggedTuples holding the given tuples, in the given order.
+        from_tuples(vals): Class method to build from a list of tuples or a ListOfTuples.
+        iter_chunks(n):    Blocks of the position-1 values, as for ListOfTuples.
+    """
+    def __init__(self, lengths, columns, rows):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def from_tuples(cls, vals):
+        if isinstance(vals, ListOfTuples):
+            vals = vals.vals
+        lengths = np.fromiter(map(len, vals), dtype=np.int64, count=len(vals))
+        columns, rows = [], []
+        for j in range(int(lengths.max()) if len(vals) else 0):
+            have_j = np.flatnonzero(lengths > j)
+            columns.append(typed_array([vals[i][j] for i in have_j.tolist()]))
+            rows.append(have_j)
+        return cls(lengths, columns, rows)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("tuple index out of range")
+        # find where tuple i sits within each column it appears in (a slice
+        # keeps the column's dtype, and tolist() converts to Python values):
+        values = []
+        for j in range(self.lengths[i]):
+            k = np.searchsorted(self.rows[j], i)
+            values.append(self.columns[j][k:k+1].tolist()[0])
+        return tuple(values)
+
+    def column(self, j):
+        return self.columns[j]
+
+    def where(self, j, test):
+        mask = np.asarray(test(self.columns[j]), dtype=bool)
+        return self.rows[j][mask]
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths[indices]        # also checks the indices are in range
+        indices = indices % len(self)          # negative indices count from the end
+        columns, rows = [], []
+        for j in range(int(lengths.max()) if len(lengths) else 0):
+            have_j = np.flatnonzero(lengths > j)               # new tuple numbers
+            # rows[j] is sorted, so searchsorted finds each old tuple's entry:
+            where = np.searchsorted(self.rows[j], indices[have_j])
+            columns.append(self.columns[j][where])
+            rows.append(have_j)
+        return RaggedTuples(lengths, columns, rows)
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+    def iter_chunks(self, n):
+        # Same values as ListOfTuples: the second element of each tuple
+        check_chunk_size(n)
+        values = self.columns[1] if len(self.columns) > 1 else np.empty(0)
+        for i in range(0, len(values), n):
+            yield values[i:i+n]          # slices are views, not copies
+
+
+data = [(1, 'a', 9, 'x'), (2, 'b'), (3, 'c', 7)]
+store = RaggedTuples.from_tuples(ListOfTuples(data))
+print('lengths:', store.lengths)
+for j, (col, row) in enumerate(zip(store.columns, store.rows)):
+    print(f'position {j}: values {col} (dtype {col.dtype}) from tuples {row}')
+print(store[0], store[1], store[2])
+for entry in store:                       # same values as ListOfTuples
+    print(entry)
+print('tuples with first value > 1:', store.where(0, lambda c: c > 1))
+print(store.take([0, 2]).tolist())
+print(store.take([2, 0, 2]).tolist())      # any order, repeats allowed
+mixed = [(True, 1), (False, 2.5), (True, 3)]
+print(RaggedTuples.from_tuples(mixed).tolist() == mixed)
+
+# A million records with 2 to 5 fields each:
+
+n = 1_000_000
+rng = np.random.default_rng(0)
+lengths = rng.integers(2, 6, size=n).tolist()
+ids = rng.integers(0, 1000, size=n).tolist()
+labels = rng.choice(['red', 'green', 'blue'], size=n).tolist()
+readings = rng.uniform(0, 10, size=n).tolist()
+records = [(ids[i], labels[i], readings[i], 'x', 0)[:lengths[i]] for i in range(n)]
+
+t0 = time.perf_counter()
+store = RaggedTuples.from_tuples(records)
+t1 = time.perf_counter()
+print(f'build RaggedTuples from {n:,} tuples: {t1-t0:.3f} s (done once)')
+
+t0 = time.perf_counter()
+second_list = [item[1] for item in records]
+high_list = [i for i, item in enumerate(records) if len(item) > 2 and item[2] > 9.5]
+t1 = time.perf_counter()
+second_col = store.column(1)
+high_col = store.where(2, lambda c: c > 9.5)
+t2 = time.perf_counter()
+
+print(f'list of tuples: {t1-t0:.4f} s')
+print(f'RaggedTuples:   {t2-t1:.4f} s')
+print('results agree:', second_list == second_col.tolist() and high_list == high_col.tolist())
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Chunked Range: Write a class EvenNumbers(Chunked) that represents the even
+   numbers from 0 up to (but not including) max, with iter_chunks(n) producing
+   np.arange() blocks.  Check that list(EvenNumbers(20)) is correct.
+2. Chunked Mean: Write a function chunked_mean(iterable) using chunks() that
+   computes the mean of all values without storing them all at once.
+3. Chunked File Reader: Write a generator that reads a text file of numbers 1000
+   lines at a time and yields each block as a NumPy array.  Use it with chunked_sum().
+4. Ragged Statistics: Using RaggedTuples.where() and column(), find the average
+   position-2 reading of all records whose label (position 1) is 'blue'.
+"""
@@ -0,0 +1,676 @@
+# Reusable Class Tools
+
+"""
+Topics
+------
+Tracking Live Instances Without __del__
+Batch Dispatch over Mixed Lists of Objects
+Cached Derived Quantities
+"""
+
+import abc
+import functools
+import itertools
+import math
+import threading
+import time
+import weakref
+import numpy as np
+
+
+print()
+print('Tracking Live Instances Without __del__:')
+print('---------------------------------------')
+
+# In the Classes and Objects lecture, the Cow class counted its herd by updating
+# a class attribute in __init__ and __del__:
+
+class Cow:
+    herd_size = 0
+    def __init__(self):
+        Cow.herd_size += 1
+    def __del__(self):
+        Cow.herd_size -= 1
+    def speak(self):
+        print("Moo")
+
+# This works for a small example, but has several problems in larger programs:
+#   -- "Cow.herd_size += 1" is really three steps (read, add, write back).  If two
+#      threads create Cows at the same moment, one of the updates can be lost.
+#   -- Every class that needs counting must repeat the same bookkeeping code.
+#   -- __del__ is not guaranteed to run at a predictable time (or at all, for
+#      objects still alive when the program exits), and objects with a __del__
+#      method need extra care from the garbage collector when they are part of
+#      a reference cycle.
+#
+# Below is a reusable alternative written as a _class decorator_: a function that
+# receives a class and returns a (modified) class.  It is applied with the same
+# @ syntax as @classmethod:
+#
+#     @track_instances()
+#     class Cow:
+#         ...
+#
+# The decorator wraps the class constructor so that each new instance is
+# counted, and attaches an InstanceStats object to the class.  The counter is an
+# itertools.count() object: advancing it with next() is a single operation
+# carried out in C, so two threads can never interleave their updates.  (A
+# threading.Lock around an ordinary integer would also work, but costs
+# noticeably more per object.)  An itertools.count() cannot be read without
+# advancing it, so reading the count takes one value from it and subtracts the
+# values taken by earlier reads; reads are rare, so they are protected by a lock.
+#
+# To know which instances are still alive without __del__, we can use _weak
+# references_ (built-in weakref module).  A weak reference refers to an object
+# without keeping it alive, and can be given a _callback_ function that is
+# called when the object is destroyed.  The live instances are tracked with a set
+# of weak references whose callback is the set's own discard() method, so a
+# destroyed object's reference removes itself.  (weakref.WeakSet does the same
+# thing, but with more of its bookkeeping written in Python.)
+#
+# A plain weakref.ref hashes and compares like the object it refers to, so two
+# equal instances would count as one, and instances of a class that defines
+# __eq__ without __hash__ could not be stored at all.  IdentityRef hashes and
+# compares by the identity of the reference itself instead.  Assigning object's
+# own C-level __hash__ and __eq__ keeps this as fast as the default.
+#
+# Live tracking is optional (live=True) because it is not free: creating a weak
+# reference with a callback, and running the callback later, costs more per
+# object than a __del__ method does (see the timings below).  What it buys is
+# reliable, thread-safe bookkeeping that stays out of the class itself, and the
+# ability to list the live instances.
+
+class IdentityRef(weakref.ref):
+    """Weak reference that hashes and compares by identity, not by its referent"""
+    __slots__ = ()
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
+
+class InstanceStats:
+    """
+    Instance statistics for one class (attached as cls.instance_stats).
+
+    Attributes:
+        created (int):  number of instances constructed so far.
+        live (int):     number of instances still alive (requires live=True).
+        destroyed (int): created - live (requires live=True).
+
+    Methods:
+        instances():        List of the live instances (requires live=True).
+        allocation_rate():  Average instances created per second since tracking began.
+        interval_rate():    Instances created per second since the previous call.
+        snapshot():         Dictionary of the current statistics.
+    """
+    def __init__(self, name, live=False):
+        self.name = name
+        self._counter = itertools.count()
+        self._reads = 0                   # values taken from _counter by reads
+        self._read_lock = threading.Lock()
+        self._live = set() if live else None   # weak references to live instances
+        self._start = time.perf_counter()
+        self._last = (self._start, 0)
+
+    @property
+    def created(self):
+        # Every instance and every earlier read has taken one value from the
+        # counter, so the next value is (instances + earlier reads):
+        with self._read_lock:
+            created = next(self._counter) - self._reads
+            self._reads += 1
+        return created
+
+    def _require_live(self):
+        if self._live is None:
+            raise AttributeError(f"{self.name} was not decorated with live=True")
+
+    @property
+    def live(self):
+        self._require_live()
+        return len(self._live)
+
+    @property
+    def destroyed(self):
+        return self.created - self.live
+
+    def instances(self):
+        self._require_live()
+        objs = (ref() for ref in list(self._live))
+        return [obj for obj in objs if obj is not None]
+
+    def allocation_rate(self):
+        return self.created / (time.perf_counter() - self._start)
+
+    def interval_rate(self):
+        now, created = time.perf_counter(), self.created
+        last_time, last_created = self._last
+        self._last = (now, created)
+        return (created - last_created) / (now - last_time)
+
+    def snapshot(self):
+        stats = {'class': self.name, 'created': self.created,
+                 'allocation_rate': self.allocation_rate()}
+        if self._live is not None:
+            stats['live'] = self.live
+            stats['destroyed'] = self.destroyed
+        return stats
+
+    def __str__(self):
+        return ', '.join(f'{k}={v}' for k, v in self.snapshot().items())
+
+
+def track_instances(live=False, enabled=True):
+    """
+    Class decorator that counts the instances of a class.
+
+    Parameters:
+        live:    if True, also track which instances are still alive (weak references)
+        enabled: if False, the class is returned unchanged (no overhead at all)
+
+    Subclasses that do not define their own __init__ are counted together with
+    the decorated class; decorate a subclass to also give it its own statistics.
+    """
+    def decorate(cls):
+        if not enabled:
+            return cls
+        stats = InstanceStats(cls.__name__, live)
+        original_init = cls.__init__
+        count = stats._counter
+        live_set = stats._live
+        # Look everything up once here, not on every call:
+        track = None if live_set is None else live_set.add
+        discard = None if live_set is None else live_set.discard
+        ref = IdentityRef
+
+        if original_init is object.__init__ and cls.__new__ is object.__new__:
+            # The class has no __init__ of its own, so it takes no arguments and
+            # there is nothing to forward them to:
+            if track is None:
+                def __init__(self):
+                    next(count)
+            else:
+                def __init__(self):
+                    next(count)
+                    track(ref(self, discard))
+            __init__.__qualname__ = f'{cls.__qualname__}.__init__'
+        # Otherwise only count objects that were fully built (original_init did
+        # not raise):
+        elif track is None:
+            @functools.wraps(original_init)
+            def __init__(self, *args, **kwargs):
+                original_init(self, *args, **kwargs)
+                next(count)
+        else:
+            @functools.wraps(original_init)
+            def __init__(self, *args, **kwargs):
+                original_init(self, *args, **kwargs)
+                next(count)
+                track(ref(self, discard))
+
+        cls.__init__ = __init__
+        cls.instance_stats = stats
+        return cls
+    return decorate
+
+
+# The Cow example, now without any bookkeeping code in the class itself:
+
+@track_instances(live=True)
+class Cow:
+    def speak(self):
+        print("Moo")
+
+c1 = Cow()
+c2 = Cow()
+print(f'The herd size is {Cow.instance_stats.live}')
+del c1
+print(f'The herd size is {Cow.instance_stats.live}')
+del c2
+print(f'The herd size is {Cow.instance_stats.live}')
+print(Cow.instance_stats)
+
+# Equal instances are still counted separately, even if the class cannot be
+# hashed (defining __eq__ without __hash__ sets __hash__ to None):
+
+@track_instances(live=True)
+class Heifer:
+    def __eq__(self, other):
+        return isinstance(other, Heifer)
+
+h1, h2 = Heifer(), Heifer()
+print(h1 == h2, Heifer.instance_stats.live)
+del h1
+print(Heifer.instance_stats.live)
+del h2
+
+# Counting from several threads at once.  Every one of the 4 x 50,000 calves is
+# counted, with no lost updates:
+
+@track_instances()
+class Calf:
+    pass
+
+def raise_calves(count):
+    for _ in range(count):
+        Calf()
+
+threads = [threading.Thread(target=raise_calves, args=(50_000,)) for _ in range(4)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print(Calf.instance_stats.created, 'calves created')
+print(f'{Calf.instance_stats.allocation_rate():,.0f} calves per second')
+
+
+# ---------------
+# Cost of tracking
+# ---------------
+
+# Compare construction + destruction time for an undecorated class, the
+# counting-only decorator, live tracking, and the original __del__ approach.
+# The decorated classes have no __init__ of their own, so they get the
+# lightweight wrapper (a class with its own __init__ pays a little more for
+# passing the arguments along):
+
+class Plain:
+    pass
+
+@track_instances()
+class Counted:
+    pass
+
+@track_instances(live=True)
+class LiveTracked:
+    pass
+
+class WithDel:
+    count = 0
+    def __init__(self):
+        WithDel.count += 1
+    def __del__(self):
+        WithDel.count -= 1
+
+n = 200_000
+for cls in (Plain, Counted, LiveTracked, WithDel):
+    best = float('inf')
+    for _ in range(3):                  # best of 3, to reduce timing noise
+        t0 = time.perf_counter()
+        objs = [cls() for _ in range(n)]
+        del objs
+        t1 = time.perf_counter()
+        best = min(best, t1 - t0)
+    print(f'{cls.__name__:<12}{best/n*1e9:8.0f} ns per object')
+
+# Counting is not free: the extra __init__ call adds roughly 150 ns per object,
+# which is about 40% of the time to build and free an empty object (and a much
+# smaller share for objects that do real work in __init__).  Live tracking costs more than __del__: Python has no cheaper way
+# to be told that an object has been destroyed than a weak reference or
+# __del__, and a weak reference is the more expensive of the two.  What it buys
+# is thread safety, keeping the bookkeeping out of the class, and instances().
+# Use live=True while investigating a leak, and enabled=False (no cost at all)
+# where every nanosecond matters.
+
+
+print()
+print('Batch Dispatch over Mixed Lists of Objects:')
+print('---------------------------------------')
+
+# Method overriding lets a list hold a mix of Animal subclasses, with each
+# object responding to speak() in its own way:
+
+class Animal:
+    def speak(self):
+        print("The animal says ", end='')
+
+class Dog(Animal):
+    def speak(self):
+        super().speak()
+        print("Woof!")
+
+class Cat(Animal):
+    def speak(self):
+        super().speak()
+        print("Meow!")
+
+for animal in [Dog(), Cat(), Dog()]:
+    animal.speak()
+
+# In a loop like this, Python looks up the correct speak() method separately
+# for every element, and the code for dogs and cats runs interleaved.  When a
+# simulation holds hundreds of thousands of components of a few different types,
+# it is much faster to:
+#   1. group the objects by their class (their _concrete type_) once, and
+#   2. call a single class method per group that handles all of that group's
+#      objects together, for example with NumPy.
+#
+# The convention used here: if a class defines a class method named
+# <method>_batch(instances, ...), it is used for the whole group of that class.
+# Otherwise each object's ordinary method is called, so classes without a batch
+# version still work.
+#
+# A batch method is only used if it belongs to the same class as the ordinary
+# method (or to a subclass of it).  Otherwise a subclass that overrides speak()
+# but inherits its parent's speak_batch() would silently get the parent behavior.
+
+def _defining_class(cls, name):
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return klass
+    return None
+
+class TypeBuckets:
+    """
+    A mixed collection of objects grouped by concrete type for batch dispatch.
+
+    Attributes:
+        groups (dict): maps each class to the list of positions of its objects.
+
+    Methods:
+        call(name, *args, **kwargs): Calls method name on every object, using the
+            class method <name>_batch(instances, *args, **kwargs) where available.
+            Returns the results in the original order of the objects.
+    """
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.groups = {}
+        for i, obj in enumerate(self.objects):
+            self.groups.setdefault(type(obj), []).append(i)
+
+    def _batch_method(self, cls, name):
+        method_owner = _defining_class(cls, name)
+        batch_owner = _defining_class(cls, name + '_batch')
+        if batch_owner is None or method_owner is None:
+            return None
+        if not issubclass(batch_owner, method_owner):
+            return None           # inherited batch method would be out of date
+        return getattr(cls, name + '_batch')
+
+    def call(self, name, *args, **kwargs):
+        results = [None] * len(self.objects)
+        for cls, positions in self.groups.items():
+            members = [self.objects[i] for i in positions]
+            batch = self._batch_method(cls, name)
+            if batch is not None:
+                out = batch(members, *args, **kwargs)
+                if out is None:
+                    continue
+            else:
+                method = getattr(cls, name)       # looked up once per class
+                out = [method(obj, *args, **kwargs) for obj in members]
+            for i, value in zip(positions, out):
+                results[i] = value
+        return results
+
+def batch_call(objects, name, *args, **kwargs):
+    """Group objects by type and call method name on all of them (see TypeBuckets)."""
+    return TypeBuckets(objects).call(name, *args, **kwargs)
+
+
+# Give Dog a batch version of speak().  Cat has none, so each Cat speaks on its own.
+# Note that the output is now grouped by type rather than in list order:
+
+class Dog(Animal):
+    def speak(self):
+        super().speak()
+        print("Woof!")
+    @classmethod
+    def speak_batch(cls, dogs):
+        print(f"{len(dogs)} dogs say Woof!")
+
+batch_call([Dog(), Cat(), Dog(), Dog()], 'speak')
+
+
+# ---------------
+# A simulation example
+# ---------------
+
+# A circuit made of many resistors and diodes.  Each component computes the
+# current through it over a sweep of voltages (a NumPy array).  For a single
+# component the arrays are small, so most of the time goes into the overhead of
+# each NumPy call rather than the arithmetic.  Resistor therefore provides a
+# batch version that computes the currents of all resistors in one operation;
+# Diode only has the per-object method.  Component is an abstract base class
+# (abc module), so every kind of component must define current().
+
+class Component(abc.ABC):
+    @abc.abstractmethod
+    def current(self, voltage):
+        """Return the current through the component at each voltage."""
+
+class Resistor(Component):
+    def __init__(self, R):
+        self.R = R
+    def current(self, voltage):
+        return voltage / self.R
+    @classmethod
+    def current_batch(cls, resistors, voltage):
+        R = np.array([r.R for r in resistors])
+        return voltage[None, :] / R[:, None]     # one row per resistor
+
+class Diode(Component):
+    def __init__(self, I_s=1e-12, V_t=0.025):
+        self.I_s = I_s
+        self.V_t = V_t
+    def current(self, voltage):
+        return self.I_s * (np.exp(voltage / self.V_t) - 1)
+
+rng = np.random.default_rng(0)
+parts = [Resistor(R) if R < 900 else Diode() for R in rng.uniform(0, 1000, 200_000).tolist()]
+sweep = np.linspace(0, 0.6, 25)
+
+t0 = time.perf_counter()
+currents_loop = [part.current(sweep) for part in parts]
+t1 = time.perf_counter()
+buckets = TypeBuckets(parts)          # group once...
+t2 = time.perf_counter()
+currents_batch = buckets.call('current', sweep)     # ...then call as often as needed
+t3 = time.perf_counter()
+
+print(f'per-object calls:    {t1-t0:.3f} s')
+print(f'grouping (once):     {t2-t1:.3f} s')
+print(f'batch dispatch:      {t3-t2:.3f} s')
+print('results agree:', np.allclose(np.array(currents_loop), np.array(currents_batch)))
+
+
+print()
+print('Cached Derived Quantities:')
+print('---------------------------------------')
+
+# Vector.magnitude() from the Classes and Objects lecture recomputes
+# sqrt(sum(c**2)) on every call, and Point.length() builds a temporary
+# Point(0,0,0) every time.  When the same object is asked for the same derived
+# quantity many times, we can _cache_ (memoize) the result: compute it once, store
+# it, and return the stored value on later calls.
+#
+# The difficulty is knowing when a cached value has become stale.  The Point
+# method double_x() changes x, after which length() must be recomputed.
+#
+# The approach below uses a _descriptor_.  A descriptor is an object stored as a
+# class attribute that defines __get__, which Python calls whenever the attribute
+# is looked up on an instance (this is how @property and methods themselves work).
+# Our cached_quantity descriptor:
+#   -- looks for the value in a per-instance dictionary, self._cache
+#   -- on a miss, calls the original method and stores the result
+#   -- counts hits and misses for each quantity, separately for each class of
+#      instance (a Vector2d and a Vector3d share the inherited magnitude()
+#      descriptor, but their statistics are kept apart)
+#
+# Invalidation is handled by the Cached base class, which overrides __setattr__
+# so that assigning to any attribute (self.x *= 2 inside double_x(), or
+# v.coordinates = ... from outside) empties the cache.  Code that changes an
+# object without assigning an attribute (e.g. modifying a list in place) must call
+# invalidate_cache() itself.
+
+class cached_quantity:
+    """
+    Decorator for methods whose result is cached until the instance changes.
+
+    The decorated method is still called with parentheses: obj.magnitude().
+
+    Attributes:
+        hits (dict):   {class: calls answered from the cache} for each instance class.
+        misses (dict): {class: calls that had to compute the value}.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.hits = {}
+        self.misses = {}
+        functools.update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self           # accessed on the class itself: Vector.magnitude
+        return functools.partial(self._lookup, obj)
+
+    def _lookup(self, obj):
+        cache = obj._cache
+        try:
+            value = cache[self.name]
+        except KeyError:
+            cls = type(obj)
+            self.misses[cls] = self.misses.get(cls, 0) + 1
+            value = cache[self.name] = self.func(obj)
+            return value
+        cls = type(obj)
+        self.hits[cls] = self.hits.get(cls, 0) + 1
+        return value
+
+class Cached:
+    """Base class whose cached_quantity results are cleared when any attribute is set."""
+    def __setattr__(self, name, value):
+        if name != '_cache':
+            self.__dict__.get('_cache', {}).clear()
+        object.__setattr__(self, name, value)
+
+    @property
+    def _cache(self):
+        try:
+            return self.__dict__['_cache']
+        except KeyError:
+            cache = self.__dict__['_cache'] = {}
+            return cache
+
+    def invalidate_cache(self):
+        self._cache.clear()
+
+def cache_stats(cls):
+    """
+    Return {name: (hits, misses)} for every cached_quantity of a class.
+
+    Only calls on instances of exactly cls are counted, not its subclasses.
+    """
+    stats = {}
+    for klass in reversed(cls.__mro__):
+        for name, attr in vars(klass).items():
+            if isinstance(attr, cached_quantity):
+                stats[name] = (attr.hits.get(cls, 0), attr.misses.get(cls, 0))
+    return stats
+
+
+# The lecture classes, with their derived quantities cached:
+
+class Point(Cached):
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+    def distance(self, p):
+        return(((self.x-p.x)**2 + (self.y-p.y)**2 + (self.z-p.z)**2)**(1/2))
+    @cached_quantity
+    def length(self):
+        return(self.distance(Point(0,0,0)))
+    def double_x(self):
+        self.x *= 2
+        return self
+    def double_y(self):
+        self.y *= 2
+        return self
+    def double_z(self):
+        self.z *= 2
+        return self
+
+class Vector(Cached):
+    """n-dimensional vector"""
+    def __init__(self, *args):
+        self.coordinates = args
+    @cached_quantity
+    def magnitude(self):
+        return math.sqrt((sum(c**2 for c in self.coordinates)))
+
+class Vector3d(Vector):
+    """3-dimensional vector"""
+    def __init__(self, x, y, z):
+        super().__init__(x,y,z)
+    @cached_quantity
+    def prism_volume(self):
+        [x,y,z] = self.coordinates
+        return(x*y*z)
+
+class Vector2d(Vector):
+    """2-dimensional vector"""
+    def __init__(self, x, y):
+        super().__init__(x,y)
+    def rectangle_area(self):
+        [x,y] = self.coordinates
+        return(x*y)
+    @cached_quantity
+    def xy_angle(self):
+        [x,y] = self.coordinates
+        return math.atan2(y, x)
+
+p = Point(1, 2, 3)
+print(p.length(), p.length())          # computed once, then read from the cache
+p.double_x()                           # assignment to x clears the cache
+print(p.length())
+print('Point cache (hits, misses):', cache_stats(Point))
+
+v2d = Vector2d(1, 1)
+print(v2d.xy_angle(), v2d.magnitude())
+v2d.coordinates = (0, 1)
+print(v2d.xy_angle(), v2d.magnitude())
+v3d = Vector3d(1, 2, 3)
+for _ in range(3):
+    v3d.prism_volume()
+print('Vector2d cache (hits, misses):', cache_stats(Vector2d))
+print('Vector3d cache (hits, misses):', cache_stats(Vector3d))
+
+# Timing: the magnitude of a 10,000-dimensional vector requested 200 times.
+
+class PlainVector:
+    def __init__(self, *args):
+        self.coordinates = args
+    def magnitude(self):
+        return math.sqrt((sum(c**2 for c in self.coordinates)))
+
+values = rng.standard_normal(10_000).tolist()
+plain, cached = PlainVector(*values), Vector(*values)
+
+t0 = time.perf_counter()
+for _ in range(200):
+    plain.magnitude()
+t1 = time.perf_counter()
+for _ in range(200):
+    cached.magnitude()
+t2 = time.perf_counter()
+print(f'recomputed: {t1-t0:.4f} s,  cached: {t2-t1:.4f} s')
+print('Vector cache (hits, misses):', cache_stats(Vector))
+
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Herd Report: Decorate the Room, Door and Window classes from practice problem 13
+   of the Classes and Objects lecture with @track_instances(live=True), and print
+   how many of each are alive after deleting a House.
+2. Peak Count: Add a peak attribute to InstanceStats that records the largest
+   number of live instances seen so far.
+3. Batch Diodes: Add a current_batch() class method to Diode, and measure how much
+   faster buckets.call('current', sweep) becomes.
+4. Cached Area: Make Vector2d.rectangle_area() a cached_quantity, and check with
+   cache_stats() that calling it twice in a row gives one miss and one hit.
+"""
@@ -0,0 +1,926 @@
+# Polynomials with NumPy: Working in Bulk
+
+"""
+Topics
+------
+Solving Many Quadratics at Once
+Roots of Many Polynomials: Stacked Companion Matrices
+Evaluating Many Polynomials: PolynomialBank
+Multiplying Polynomials with the FFT
+Fitting a Polynomial to a Stream of Data
+Fitting Many Data Sets on the Same x Values
+"""
+
+import itertools
+import math
+import time
+import numpy as np
+
+
+print()
+print('Solving Many Quadratics at Once:')
+print('---------------------------------------')
+
+# In the Functions lecture we wrote functions to evaluate a quadratic and to find
+# its roots with the textbook quadratic formula:
+
+def quad_eval(coefs, x):
+    if len(coefs) != 3:
+        print('improper coefficient list')
+        return(None)
+    a,b,c = coefs
+    return(a*x**2 + b*x + c)
+
+def roots(coefs):
+    (a,b,c) = coefs
+    disc = (b**2 - 4*a*c)**(0.5)
+    r1 = (-b + disc)/(2*a)
+    r2 = (-b - disc)/(2*a)
+    return [r1, r2]
+
+# These functions have two weaknesses:
+#
+# 1. They handle one quadratic per call.  Solving millions of quadratics (e.g. one
+#    per element of a simulation, or per ray in a ray tracer) takes millions of
+#    Python function calls.
+#
+# 2. The textbook formula can be very inaccurate.  When b^2 is much larger than
+#    |4ac|, disc is almost equal to |b|, and one of -b + disc or -b - disc
+#    subtracts two nearly equal numbers.  The leading digits cancel, leaving mostly
+#    rounding error.  This is called _catastrophic cancellation_.  For example,
+#    x^2 + 1e8 x + 1 has roots very close to -1e-8 and -1e8:
+
+print(roots([1, 1e8, 1]))          # the small root comes out badly wrong
+
+# Also note that roots() returns complex values only when the discriminant is
+# negative, so the type of the result changes from one call to the next.
+#
+# The numerically stable formulation avoids the cancellation by never
+# subtracting nearly equal numbers.  First compute
+#
+#     q = -(b + sign(b)*sqrt(b^2 - 4ac)) / 2
+#
+# where b and sign(b)*sqrt(...) always have the same sign, so they add without
+# cancellation.  The two roots are then
+#
+#     r1 = q / a        and        r2 = c / q
+#
+# (the second form follows from r1*r2 = c/a).
+#
+# solve_quadratics() applies this formula to whole arrays of coefficients at once.
+# To keep the output type predictable, it returns float64 arrays when every
+# quadratic has real roots, and complex128 arrays for all of them otherwise.
+
+def solve_quadratics(A, B, C):
+    """
+    Solve A*x^2 + B*x + C = 0 for arrays of coefficients.
+
+    Parameters:
+        A, B, C: arrays (or numbers) of the same shape, or shapes that broadcast.
+
+    Returns:
+        (r1, r2): arrays of roots.  float64 if every discriminant is >= 0,
+                  otherwise complex128.  Where A == 0 the equation is linear:
+                  r1 is -C/B and r2 is nan.
+    """
+    A, B, C = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (A, B, C)))
+    disc = B*B - 4*A*C
+    if np.all(disc >= 0):
+        sqrt_disc = np.sqrt(disc)
+    else:
+        sqrt_disc = np.sqrt(disc.astype(np.complex128))
+    q = -0.5 * (B + np.copysign(1.0, B) * sqrt_disc)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r1 = q / A
+        r2 = C / q
+        # Special cases the general formula cannot handle:
+        both_zero = (q == 0)                  # B = C = 0: double root at 0
+        r2 = np.where(both_zero, 0, r2)
+        linear = (A == 0)                     # B*x + C = 0
+        r1 = np.where(linear, -C / B, r1)
+        r2 = np.where(linear, np.nan, r2)
+    return r1, r2
+
+def quad_eval_many(A, B, C, x):
+    """Evaluate A*x^2 + B*x + C element-wise using Horner's form (A*x + B)*x + C."""
+    A, B, C, x = (np.asarray(v) for v in (A, B, C, x))
+    return (A*x + B)*x + C
+
+print(solve_quadratics(1, 1e8, 1))     # both roots accurate
+print(solve_quadratics([1, 2, 2], [2, 0, 0], [1, -2, 2]))   # the Functions lecture examples
+print(solve_quadratics([0, 1], [2, -3], [-4, 2]))            # linear and quadratic
+
+# Check: plugging the roots back in should give (nearly) zero:
+
+rng = np.random.default_rng(0)
+N = 1_000_000
+A = rng.uniform(-10, 10, N)
+B = rng.uniform(-1e4, 1e4, N)
+C = rng.uniform(-10, 10, N)
+r1, r2 = solve_quadratics(A, B, C)
+print('largest residual (relative to |C|):',
+      np.max(np.abs(quad_eval_many(A, B, C, r2)) / np.abs(C)))
+
+
+# ---------------
+# Speed comparison
+# ---------------
+
+# Solve and evaluate the same 1,000,000 quadratics with the scalar functions in a
+# loop, and with the batch functions:
+
+coef_list = np.column_stack([A, B, C]).tolist()
+
+t0 = time.perf_counter()
+roots_loop = [roots(coefs) for coefs in coef_list]
+values_loop = [quad_eval(coefs, 1.5) for coefs in coef_list]
+t1 = time.perf_counter()
+r1, r2 = solve_quadratics(A, B, C)
+values_batch = quad_eval_many(A, B, C, 1.5)
+t2 = time.perf_counter()
+
+print(f'scalar loop: {t1-t0:.3f} s')
+print(f'batch:       {t2-t1:.3f} s')
+print('values agree:', np.allclose(values_loop, values_batch))
+
+
+print()
+print('Roots of Many Polynomials: Stacked Companion Matrices:')
+print('---------------------------------------')
+
+# For polynomials of higher degree there is no simple formula, and np.roots()
+# finds the roots with linear algebra.  For a polynomial
+#
+#     p(x) = c0 x^n + c1 x^(n-1) + ... + cn
+#
+# np.roots() builds the n x n _companion matrix_
+#
+#     [ -c1/c0  -c2/c0  ...  -cn/c0 ]
+#     [   1       0     ...     0   ]
+#     [   0       1     ...     0   ]
+#     [   :             ...     :   ]
+#     [   0       0     ...  1  0   ]
+#
+# whose eigenvalues are exactly the roots of p(x), and then calls
+# np.linalg.eigvals().  Each call to np.roots() handles a single polynomial, so
+# finding the roots of thousands of polynomials means thousands of small
+# eigenvalue problems, each with its own Python and LAPACK call overhead.
+#
+# np.linalg.eigvals() also accepts a _stack_ of matrices, an array of shape
+# (N, n, n), and solves all N eigenvalue problems in one call.  roots_many()
+# builds the companion matrices of all rows of a coefficient matrix at once.
+#
+# Leading zeros lower the degree of a polynomial (0x^3 + x^2 - 1 is a quadratic),
+# so each row is trimmed first.  Rows are grouped by their true degree and each
+# group is solved with one stacked call.  The result is padded with nan so that
+# every row fits in one array, together with a count of the roots in each row.
+
+def roots_many(coeff_matrix):
+    """
+    Find the roots of many polynomials.
+
+    Parameters:
+        coeff_matrix: (N, n+1) real or complex array; each row holds the
+                      coefficients of one polynomial, highest power first (as
+                      for np.roots).
+
+    Returns:
+        roots:  (N, n) complex128 array, roots of row i in roots[i, :counts[i]]
+                and nan in the remaining entries
+        counts: (N,) int array, number of roots of each row
+    """
+    coeffs = np.atleast_2d(np.asarray(coeff_matrix))
+    coeffs = coeffs.astype(np.complex128 if np.iscomplexobj(coeffs) else np.float64)
+    N, n_plus_1 = coeffs.shape
+    n = n_plus_1 - 1
+    roots = np.full((N, max(n, 0)), np.nan + 1j*np.nan)
+
+    # Degree of each row after trimming leading zeros (0 for an all-zero row):
+    nonzero = coeffs != 0
+    first = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), n_plus_1)
+    degree = np.maximum(n - first, 0)
+    counts = degree.copy()
+
+    for k in np.unique(degree):
+        if k == 0:
+            continue                           # constants have no roots
+        rows = np.flatnonzero(degree == k)
+        c = coeffs[rows, n-k:]                  # trimmed coefficients, (m, k+1)
+        companion = np.zeros((len(rows), k, k), dtype=coeffs.dtype)
+        companion[:, 0, :] = -c[:, 1:] / c[:, :1]
+        companion[:, np.arange(1, k), np.arange(k-1)] = 1
+        roots[rows, :k] = np.linalg.eigvals(companion)
+    return roots, counts
+
+# The examples from the NumPy lecture, plus a row with a leading zero:
+
+P = [[1, -5, 6, 0],       # x^3 - 5x^2 + 6x  = x(x-2)(x-3)
+     [0, 1, 0, 1],        # x^2 + 1
+     [0, 0, 2, -8],       # 2x - 8
+     [0, 0, 0, 5]]        # constant: no roots
+r, counts = roots_many(P)
+print(np.round(r, 10))
+print(counts)
+
+# 20,000 random polynomials of degree 6:
+
+coeffs = rng.standard_normal((20_000, 7))
+
+t0 = time.perf_counter()
+roots_loop = [np.roots(c) for c in coeffs]
+t1 = time.perf_counter()
+roots_batch, counts = roots_many(coeffs)
+t2 = time.perf_counter()
+
+print(f'np.roots() loop: {t1-t0:.3f} s')
+print(f'roots_many():    {t2-t1:.3f} s')
+print('results agree:', np.allclose(np.sort_complex(np.array(roots_loop)),
+                                   np.sort_complex(roots_batch)))
+
+
+print()
+print('Evaluating Many Polynomials: PolynomialBank:')
+print('---------------------------------------')
+
+# np.polyval() evaluates one polynomial at many x values.  A common situation is
+# the reverse: many fitted models (one per sensor, per test specimen, ...) that
+# all need to be evaluated on the same x grid.  A loop of np.polyval() calls
+# handles one polynomial per call, and each call allocates new temporary arrays.
+#
+# np.polyval() uses _Horner's method_, which rewrites a polynomial as nested
+# multiplications:
+#
+#     2x^3 - 5x^2 + 3x - 7  =  ((2x - 5)x + 3)x - 7
+#
+# Horner's method needs only n multiplications and n additions for degree n.
+# Applied to a whole matrix of coefficients, with one row per polynomial, each
+# step of Horner's method updates every polynomial at every x value at once.
+#
+# PolynomialBank stores the coefficient rows in a 2D array and evaluates them
+# with in-place operations (*= and +=) on a single output array, so no temporary
+# arrays are created.  The output array can be passed in with out= and reused
+# from one call to the next.  The rows are processed in blocks, so that each block
+# is still in the CPU cache for the next Horner step instead of being read back
+# from main memory every time.  Storing the bank as float32 halves the number of
+# bytes moved through memory, at the cost of about 7 significant digits instead
+# of 16.
+
+class PolynomialBank:
+    """
+    Many polynomials of the same degree, evaluated together.
+
+    Attributes:
+        coeffs (np.ndarray): (N, degree+1) coefficients, highest power first
+
+    Methods:
+        __call__(x, out): Returns an (N, len(x)) array; row i holds polynomial i at x
+        polynomial(i):    Returns polynomial i as a np.poly1d object
+    """
+    block_size = 1 << 16        # values evaluated together (see __call__)
+
+    def __init__(self, coeffs, dtype=np.float64):
+        self.coeffs = np.atleast_2d(np.array(coeffs, dtype=dtype))
+        if self.coeffs.ndim != 2:
+            raise ValueError("coefficients must form a 2D array")
+
+    @property
+    def degree(self):
+        return self.coeffs.shape[1] - 1
+
+    @property
+    def dtype(self):
+        return self.coeffs.dtype
+
+    def __len__(self):
+        return self.coeffs.shape[0]
+
+    def polynomial(self, i):
+        return np.poly1d(self.coeffs[i])
+
+    def __call__(self, x, out=None):
+        x = np.asarray(x, dtype=self.dtype).ravel()
+        shape = (len(self), len(x))
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape or out.dtype != self.dtype:
+            raise ValueError(f"out must be a {self.dtype} array of shape {shape}")
+        # Work through the rows in blocks small enough to stay in the CPU cache
+        # while all of the Horner steps are applied to them:
+        rows = max(1, self.block_size // max(len(x), 1))
+        for i in range(0, len(self), rows):
+            block = out[i:i+rows]
+            c = self.coeffs[i:i+rows]
+            block[...] = c[:, :1]                  # leading coefficients
+            for k in range(1, self.degree + 1):
+                block *= x                         # multiply every row by x ...
+                block += c[:, k:k+1]               # ... and add the next coefficient
+        return out
+
+# The polynomial from the NumPy lecture and its derivative, in one bank:
+
+bank = PolynomialBank([[0, 2, -5, 3, -7],
+                       [0, 0, 6, -10, 3]])
+print(bank([0, 1, 2, 3, 4]))
+print(np.polyval([2, -5, 3, -7], [0, 1, 2, 3, 4]))
+
+# 5,000 random polynomials of degree 5 on a grid of 2,000 x values:
+
+coeffs = rng.standard_normal((5_000, 6))
+x = np.linspace(-1, 1, 2_000)
+bank = PolynomialBank(coeffs)
+bank32 = PolynomialBank(coeffs, dtype=np.float32)
+out = np.empty((len(bank), len(x)))
+out32 = np.empty((len(bank32), len(x)), dtype=np.float32)
+
+t0 = time.perf_counter()
+values_loop = np.array([np.polyval(c, x) for c in coeffs])
+t1 = time.perf_counter()
+bank(x, out=out)
+t2 = time.perf_counter()
+bank32(x, out=out32)
+t3 = time.perf_counter()
+
+print(f'np.polyval() loop:        {t1-t0:.3f} s')
+print(f'PolynomialBank (float64): {t2-t1:.3f} s')
+print(f'PolynomialBank (float32): {t3-t2:.3f} s')
+print('float64 values agree:', np.allclose(values_loop, out))
+print('largest float32 error:', np.max(np.abs(out32 - values_loop)))
+
+
+print()
+print('Multiplying Polynomials with the FFT:')
+print('---------------------------------------')
+
+# Multiplying two polynomials means _convolving_ their coefficient lists:
+# coefficient k of the product is the sum of a[i]*b[k-i] over all i.
+# np.polymul() computes these sums directly, which takes len(a)*len(b)
+# multiplications.  For two polynomials of degree 50,000 that is 2.5 billion
+# multiplications.
+#
+# The _Fast Fourier Transform_ (np.fft) gives a much faster route.  The FFT of
+# a coefficient list is the list of values of the polynomial at equally spaced
+# points on the unit circle of the complex plane.  Multiplying two polynomials
+# multiplies their values point by point, so
+#
+#     product = inverse FFT( FFT(a) * FFT(b) )
+#
+# where both FFTs are padded to at least len(a) + len(b) - 1 points.  This takes
+# about n*log(n) operations instead of n^2.  For short polynomials the direct
+# method is faster, so polymul() only switches to the FFT above a threshold.
+#
+# The FFT works in floating point, so the result carries small rounding errors
+# even when every coefficient is an integer.  The error is at most about
+#
+#     eps * log2(n) * ||a|| * ||b||
+#
+# where eps is the float64 machine epsilon (about 2.2e-16) and ||a|| is the
+# Euclidean norm of the coefficient list.  When this bound is well below 0.5,
+# rounding the FFT result to the nearest integer gives the exact answer.
+# Otherwise polymul() falls back to the direct method, and if the exact result
+# could overflow int64 it uses Python integers (dtype=object), which never
+# overflow.
+
+FFT_THRESHOLD = 64
+
+def polymul_fft(a, b):
+    """Multiply two coefficient arrays using the FFT (floating-point result)."""
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()          # next power of 2 is fastest
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return np.fft.ifft(np.fft.fft(a, size) * np.fft.fft(b, size))[:n]
+    # rfft/irfft skip the redundant half of the spectrum of real data:
+    return np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+
+def polymul(p1, p2, threshold=FFT_THRESHOLD):
+    """
+    Multiply two polynomials, like np.polymul().
+
+    Uses direct convolution when either polynomial has fewer than threshold
+    coefficients, and the FFT otherwise.  Integer inputs give exact integer
+    results, including Python integers too large for int64 (which NumPy
+    stores with dtype=object).
+    """
+    a = np.atleast_1d(np.asarray(p1))
+    b = np.atleast_1d(np.asarray(p2))
+    if min(len(a), len(b)) < threshold:
+        return np.convolve(a, b)
+    if a.dtype.kind == 'O' or b.dtype.kind == 'O':
+        # Arbitrary Python objects: the FFT cannot handle them
+        return np.convolve(a.astype(object), b.astype(object))
+    if a.dtype.kind in 'iu' and b.dtype.kind in 'iu':
+        largest = float(np.abs(a).max()) * float(np.abs(b).max()) * min(len(a), len(b))
+        if largest >= 2**63:
+            return np.convolve(a.astype(object), b.astype(object))
+        n = len(a) + len(b) - 1
+        error = (np.finfo(np.float64).eps * 3 * max(np.log2(n), 1)
+                 * np.linalg.norm(a.astype(np.float64)) * np.linalg.norm(b.astype(np.float64)))
+        if error < 0.25:
+            return np.rint(polymul_fft(a.astype(np.float64), b.astype(np.float64))).astype(np.int64)
+        return np.convolve(a.astype(np.int64), b.astype(np.int64))
+    return polymul_fft(a, b)
+
+# The example from the NumPy lecture, forcing the FFT with threshold=0:
+
+p1 = [1, 2, 3]     # x^2 + 2x + 3
+p2 = [4, 5]        #       4x + 5
+print("p1 * p2:", np.polymul(p1, p2))
+print("p1 * p2:", polymul(p1, p2, threshold=0))
+
+# Integer polynomials of degree 50,000 (exact results are required):
+
+a = rng.integers(-999, 1000, 50_001)
+b = rng.integers(-999, 1000, 50_001)
+
+t0 = time.perf_counter()
+direct = np.polymul(a, b)
+t1 = time.perf_counter()
+fast = polymul(a, b)
+t2 = time.perf_counter()
+print(f'np.polymul(): {t1-t0:.3f} s')
+print(f'polymul():    {t2-t1:.3f} s')
+print('identical results:', np.array_equal(direct, fast))
+
+# Floating-point coefficients agree to rounding error:
+
+a = rng.standard_normal(50_001)
+b = rng.standard_normal(50_001)
+print('float results agree:', np.allclose(np.polymul(a, b), polymul(a, b)))
+
+
+# ---------------
+# Polynomials from many roots: a product tree
+# ---------------
+
+# np.poly(roots) builds the polynomial (x - r1)(x - r2)...(x - rn) by
+# multiplying in one factor at a time.  The partial product keeps growing, so
+# the last few multiplications involve long polynomials and the FFT cannot help
+# much: each step multiplies a long polynomial by a short one.
+#
+# A _product tree_ instead multiplies the factors in pairs, then the pairs in
+# pairs, and so on:
+#
+#     (x-r1)(x-r2)   (x-r3)(x-r4)   (x-r5)(x-r6)   (x-r7)(x-r8)
+#          \            /                \            /
+#       degree 4 polynomial          degree 4 polynomial
+#                  \                     /
+#                    degree 8 polynomial
+#
+# At every level the polynomials being multiplied have equal length, which is
+# exactly where the FFT is fastest.  There are log2(n) levels, each costing about
+# n*log(n) operations, for O(n log^2 n) in total instead of n^2.
+
+def poly_from_roots(roots, threshold=FFT_THRESHOLD):
+    """Return the coefficients of the monic polynomial with the given roots, like np.poly()."""
+    roots = np.atleast_1d(np.asarray(roots))
+    if not np.iscomplexobj(roots):
+        roots = roots.astype(np.float64)
+    if len(roots) == 0:
+        return np.array([1.0])
+    level = [np.array([1, -r]) for r in roots]
+    while len(level) > 1:
+        pairs = [polymul(level[i], level[i+1], threshold)
+                 for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            pairs.append(level[-1])
+        level = pairs
+    p = level[0]
+    # As np.poly() does, return real coefficients when the complex roots come in
+    # conjugate pairs:
+    if np.iscomplexobj(p) and np.array_equal(np.sort_complex(roots),
+                                             np.sort_complex(roots.conj())):
+        p = p.real.copy()
+    return p
+
+print(np.poly([1, -1, 4]))
+print(poly_from_roots([1, -1, 4]))
+
+# Random roots in conjugate pairs on the unit circle:
+
+angles = rng.uniform(0, np.pi, 20)
+r = np.concatenate([np.exp(1j*angles), np.exp(-1j*angles)])
+print('40 roots, results agree:', np.allclose(np.poly(r), poly_from_roots(r)))
+
+angles = rng.uniform(0, np.pi, 500)
+r = np.concatenate([np.exp(1j*angles), np.exp(-1j*angles)])
+t0 = time.perf_counter()
+np.poly(r)
+t1 = time.perf_counter()
+poly_from_roots(r)
+t2 = time.perf_counter()
+print(f'1,000 roots, np.poly():         {t1-t0:.3f} s')
+print(f'1,000 roots, poly_from_roots(): {t2-t1:.3f} s')
+
+# A word of caution: the coefficients of a polynomial with a thousand roots
+# already range over dozens of orders of magnitude, and with a few thousand
+# roots they overflow float64 altogether.  Tiny relative changes in the largest
+# coefficients also move the roots a long way.  Whichever method is used, such
+# coefficient lists are only useful for further polynomial arithmetic, not for
+# finding the roots again with np.roots().
+
+
+print()
+print('Fitting a Polynomial to a Stream of Data:')
+print('---------------------------------------')
+
+# In the Generators lecture, sensor_stream() produced an endless sequence of
+# sensor readings.  Suppose we want to track a slowly drifting sensor by fitting
+# a polynomial to its readings, and to keep the fit up to date as every new
+# reading arrives.  Calling np.polyfit() on all of the data after every reading
+# repeats all of the previous work: the cost of each refit grows with the length
+# of the history, and the total cost grows with its square.
+#
+# A least-squares fit of degree n solves the _normal equations_
+#
+#     (V^T V) c = V^T y
+#
+# where row i of the matrix V is [t_i^n, ..., t_i, 1] for sample time t_i.  Both
+# V^T V, an (n+1) x (n+1) matrix, and V^T y, a vector of length n+1, are sums
+# with one term per sample, so a new sample only _adds_ a term.  Better still,
+# the _recursive least squares_ (RLS) method updates the inverse
+# P = (V^T V)^-1 and the coefficients c directly with the Sherman-Morrison
+# formula:
+#
+#     k = P v / (1 + v^T P v)            (v = [t^n, ..., t, 1] for the new sample)
+#     c = c + k (y - v^T c)              (correct c by the prediction error)
+#     P = P - k (P v)^T
+#
+# Each update takes about (n+1)^2 operations, no matter how long the stream has
+# been running.
+#
+# To follow a drifting signal, old samples must eventually stop counting:
+#
+#   - A _forgetting factor_ 0 < lam <= 1 multiplies the weight of every earlier
+#     sample by lam at each step, so a sample that is m steps old has weight
+#     lam^m.  Roughly the last 1/(1-lam) samples matter.
+#   - A _sliding window_ keeps exactly the last `window` samples.  Each sample
+#     leaving the window is removed with the same formula run in reverse.
+#
+# Large powers of t are badly scaled (t^3 at t = 10,000 is 10^12), so the fit
+# uses the shifted and scaled time x = (t - origin)/scale.  scale should be
+# about the time span of the data that matters (the window, or 1/(1-lam)
+# samples), and origin moves forward with the data so that x stays small.
+# coefficients() are therefore for a polynomial in x, and __call__() takes care
+# of the conversion.
+
+import collections
+
+def timed_sensor_stream(drift, noise, dt=1.0):
+    """Yield (time, reading) pairs from a sensor whose mean follows the polynomial drift."""
+    t = 0.0
+    while True:
+        yield t, np.polyval(drift, t) + rng.normal(0, noise)
+        t += dt
+
+class StreamingPolyfit:
+    """
+    Least-squares polynomial fit updated one sample at a time.
+
+    Attributes:
+        degree (int):       polynomial degree
+        forgetting (float): weight factor applied to earlier samples at each update
+        window (int):       number of most recent samples in the fit (None for all)
+        scale (float):      time scale; the fit is a polynomial in (t - origin)/scale
+        origin (float):     current time origin of the fit
+
+    Methods:
+        update(t, y):       Adds one sample
+        coefficients():     Returns the current coefficients (polynomial in x), highest power first
+        __call__(t):        Evaluates the current fit at time(s) t
+    """
+    def __init__(self, degree, forgetting=1.0, window=None, scale=1.0):
+        if not 0 < forgetting <= 1:
+            raise ValueError("forgetting factor must be in (0, 1]")
+        if window is not None and forgetting != 1:
+            raise ValueError("use either a forgetting factor or a window, not both")
+        if window is not None and window <= degree:
+            raise ValueError("window must hold more than degree samples")
+        self.degree = degree
+        self.forgetting = forgetting
+        self.window = window
+        self.scale = scale
+        self.origin = None
+        self.count = 0
+        self._powers = np.arange(degree, -1, -1)
+        self._samples = collections.deque()     # (t, y) pairs, while needed
+        self._P = None
+        self._c = np.zeros(degree + 1)
+        self._since_refit = 0
+
+    def _regressor(self, t):
+        return ((t - self.origin) / self.scale) ** self._powers
+
+    def _refit(self):
+        # Direct weighted least-squares solve on the stored samples, with the
+        # time origin moved to the oldest one:
+        t, y = np.array(self._samples).T
+        self.origin = t[0]
+        weights = self.forgetting ** np.arange(len(t) - 1, -1, -1)
+        V = ((t[:, None] - self.origin) / self.scale) ** self._powers
+        self._P = np.linalg.inv((V.T * weights) @ V)
+        self._c = self._P @ ((V.T * weights) @ y)
+        self._since_refit = 0
+
+    def _shift_origin(self, t):
+        # Re-express the fit in x' = x - d.  Each power expands by the binomial
+        # theorem, x^p = sum over q of comb(p, q) d^(p-q) x'^q, so v = T v' with
+        # the matrix T below; then c' = T^T c and P' = T^T P T.
+        d = (t - self.origin) / self.scale
+        n = self.degree
+        T = np.zeros((n + 1, n + 1))
+        for i, p in enumerate(self._powers):
+            for j, q in enumerate(self._powers):
+                if q <= p:
+                    T[i, j] = math.comb(p, q) * d**(p - q)
+        self._c = T.T @ self._c
+        self._P = T.T @ self._P @ T
+        self.origin = t
+
+    def update(self, t, y):
+        if self.origin is None:
+            self.origin = t
+        self.count += 1
+        if self._P is None:
+            # Until there are degree+1 samples, V^T V cannot be inverted; keep
+            # the samples and start the recursion with one small direct solve.
+            self._samples.append((t, y))
+            if len(self._samples) == self.degree + 1:
+                self._refit()
+                if self.window is None:
+                    self._samples.clear()
+            return
+
+        if self.window is None:
+            # Keep x = (t - origin)/scale small, so that the powers of x stay
+            # well scaled however long the stream runs:
+            if abs(t - self.origin) > self.scale:
+                self._shift_origin(t)
+            self._add(self._regressor(t), y)
+            return
+
+        self._samples.append((t, y))
+        self._since_refit += 1
+        if self._since_refit >= self.window:
+            # Removing samples slowly accumulates rounding error, so every
+            # `window` updates the fit is recomputed from the window directly.
+            # This costs about window*(degree+1)^2 operations, i.e. (degree+1)^2
+            # per update on average.
+            while len(self._samples) > self.window:
+                self._samples.popleft()
+            self._refit()
+            return
+        self._add(self._regressor(t), y)
+        if len(self._samples) > self.window:
+            t_old, y_old = self._samples.popleft()
+            self._remove(self._regressor(t_old), y_old)
+
+    def _add(self, v, y):
+        lam = self.forgetting
+        Pv = self._P @ v
+        k = Pv / (lam + v @ Pv)
+        self._c += k * (y - v @ self._c)
+        P = self._P - np.outer(k, Pv)
+        # P must stay symmetric.  Rounding errors break the symmetry a little
+        # at each step, and dividing by lam would make them grow, so average P
+        # with its transpose:
+        self._P = (P + P.T) / (2*lam)
+
+    def _remove(self, v, y):
+        Pv = self._P @ v
+        k = Pv / (1 - v @ Pv)
+        self._c -= k * (y - v @ self._c)
+        P = self._P + np.outer(k, Pv)
+        self._P = (P + P.T) / 2
+
+    def coefficients(self):
+        if self._P is None:
+            raise ValueError(f"need at least {self.degree + 1} samples")
+        return self._c.copy()
+
+    def __call__(self, t):
+        x = (np.asarray(t, dtype=np.float64) - self.origin) / self.scale
+        return np.polyval(self.coefficients(), x)
+
+# A sensor drifting along a quadratic.  Fit a quadratic to the last 500 readings
+# and compare with np.polyfit() applied to the same 500 readings:
+
+drift = [-2e-7, 1e-3, 5.0]                    # 5 + 0.001 t - 2e-7 t^2
+stream = timed_sensor_stream(drift, noise=0.1)
+fit = StreamingPolyfit(2, window=500, scale=500)
+
+history = []
+for t, y in itertools.islice(stream, 5_000):
+    fit.update(t, y)
+    history.append((t, y))
+
+t_win, y_win = np.array(history[-500:]).T
+print('streaming fit:', fit.coefficients())
+print('np.polyfit():  ', np.polyfit((t_win - fit.origin) / fit.scale, y_win, 2))
+print(f'predicted at t = 5000: {fit(5000):.4f}   true mean: {np.polyval(drift, 5000):.4f}')
+
+# With a forgetting factor instead of a window:
+
+fit_lam = StreamingPolyfit(2, forgetting=0.998, scale=500)
+for t, y in history:
+    fit_lam.update(t, y)
+print(f'forgetting factor fit at t = 5000: {fit_lam(5000):.4f}')
+
+# Cost per update, compared with refitting the window with np.polyfit() after
+# every reading:
+
+t0 = time.perf_counter()
+for t, y in itertools.islice(stream, 2_000):
+    fit.update(t, y)
+t1 = time.perf_counter()
+window = collections.deque(history[-500:], maxlen=500)
+for t, y in itertools.islice(stream, 2_000):
+    window.append((t, y))
+    tw, yw = np.array(window).T
+    np.polyfit((tw - fit.origin) / fit.scale, yw, 2)
+t2 = time.perf_counter()
+print(f'streaming update: {(t1-t0)/2_000*1e6:.1f} us per reading')
+print(f'np.polyfit refit: {(t2-t1)/2_000*1e6:.1f} us per reading')
+
+
+print()
+print('Fitting Many Data Sets on the Same x Values:')
+print('---------------------------------------')
+
+# Often many data series share the same sample points: readings from hundreds
+# of sensors logged at the same times, or yearly data for many locations.
+# Fitting each series with its own np.polyfit() call rebuilds and factorizes the
+# same matrix every time, since the matrix depends only on x:
+#
+#     V = [[x_1^n  ...  x_1  1]
+#          [x_2^n  ...  x_2  1]
+#          [  :            :  ]
+#          [x_m^n  ...  x_m  1]]
+#
+# (V is called a _Vandermonde matrix_.)  A least-squares fit is usually solved
+# with the _QR factorization_ V = QR, where Q has orthonormal columns and R is an
+# upper-triangular square matrix.  The coefficients c for data y then follow from
+# the small triangular system R c = Q^T y.  With the data series stored as the
+# columns of a matrix Y, one factorization and one matrix product Q^T Y handle
+# every series at once.
+#
+# Before factorizing, each column of V is divided by its length.  Powers of x
+# can differ by many orders of magnitude, and this _column scaling_ keeps them
+# comparable (this is also why the MATLAB sunspots example fits against
+# delta_year = year - min(year) rather than year).
+#
+# The _condition number_ measures how much the coefficients can change for a
+# small change in the data.  For least squares it depends on both the matrix
+# and the data: with kappa the condition number of V, a fit whose residual r is
+# large compared to the fitted values V c is more sensitive, approximately
+#
+#     kappa + kappa^2 * ||r|| / ||V c||
+#
+# polyfit_many() reports this for each series.
+
+def _vander_qr(x, deg):
+    # Columns in increasing powers [1, x, ..., x^deg], scaled to unit length.
+    # R below must be square, so there must be at least deg+1 sample points:
+    x = np.asarray(x, dtype=np.float64)
+    if deg < 0:
+        raise ValueError("deg must be non-negative")
+    if x.ndim != 1:
+        raise ValueError("x must be a 1D array")
+    if len(x) <= deg:
+        raise ValueError(f"a degree {deg} fit needs at least {deg + 1} sample points "
+                         f"(got {len(x)})")
+    V = x[:, None] ** np.arange(deg + 1)
+    scale = np.linalg.norm(V, axis=0)
+    Q, R = np.linalg.qr(V / scale)
+    return V, Q, R, scale
+
+def polyfit_many(x, Y, deg):
+    """
+    Least-squares polynomial fits of every column of Y against the same x.
+
+    Parameters:
+        x:   (m,) sample points
+        Y:   (m,) or (m, K) data; each column is one series
+        deg: polynomial degree
+
+    Returns:
+        coeffs:    (deg+1, K) coefficients, highest power first (as np.polyfit)
+        residuals: (K,) sum of squared residuals of each fit
+        cond:      (K,) least-squares condition number of each fit
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    Y2 = Y.reshape(len(Y), -1)
+    V, Q, R, scale = _vander_qr(x, deg)
+    c = np.linalg.solve(R, Q.T @ Y2) / scale[:, None]
+    fitted = V @ c
+    residuals = np.sum((Y2 - fitted)**2, axis=0)
+    kappa = np.linalg.cond(R)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cond = kappa + kappa**2 * np.sqrt(residuals) / np.linalg.norm(fitted, axis=0)
+    coeffs = c[::-1]
+    if Y.ndim == 1:
+        return coeffs[:, 0], residuals[0], cond[0]
+    return coeffs, residuals, cond
+
+# Synthetic yearly data for 2,000 locations over 40 years, fitted against
+# delta_year as in the MATLAB sunspots example:
+
+year = np.arange(1980, 2021)
+delta_year = year - year.min()
+K = 2_000
+trend = rng.normal(0, 1, (4, K))
+Y = (np.polyval(trend, (delta_year[:, None] - 20) / 20)
+     + np.sin(delta_year[:, None] / 4 + rng.uniform(0, 6, K))
+     + rng.normal(0, 0.2, (len(year), K)))
+
+t0 = time.perf_counter()
+coeffs_loop = np.column_stack([np.polyfit(delta_year, Y[:, k], 3) for k in range(K)])
+t1 = time.perf_counter()
+coeffs, residuals, cond = polyfit_many(delta_year, Y, 3)
+t2 = time.perf_counter()
+
+print(f'np.polyfit() loop: {t1-t0:.3f} s')
+print(f'polyfit_many():    {t2-t1:.3f} s')
+print('coefficients agree:', np.allclose(coeffs_loop, coeffs))
+print('condition numbers from', cond.min().round(1), 'to', cond.max().round(1))
+
+# (np.polyfit() will also accept a 2D y and fit every column at once, but it
+# does not report residuals and condition numbers per series, or reuse its work
+# across different degrees as below.)
+
+
+# ---------------
+# Choosing the degree: a model-order sweep
+# ---------------
+
+# To pick the degree of each fit we might try every degree from 1 to k.  Refitting
+# for each degree repeats most of the work, because the QR factorization is
+# _nested_: with the columns in increasing powers, the first d+1 columns of V
+# (the matrix for degree d) are factorized by the first d+1 columns of Q and the
+# top-left (d+1) x (d+1) block of R.  One factorization for degree k therefore
+# serves every lower degree.
+#
+# The residuals for all degrees come almost for free too.  Since Q has
+# orthonormal columns, the squared residual of the degree-d fit is
+#
+#     ||y||^2 - (z_0^2 + z_1^2 + ... + z_d^2)        where z = Q^T y
+#
+# so a cumulative sum over the rows of Q^T Y gives every degree at once.
+
+def polyfit_sweep(x, Y, max_deg):
+    """
+    Fit every column of Y with every degree from 1 to max_deg.
+
+    Returns:
+        coeffs:    list; coeffs[d-1] is the (d+1, K) coefficient array for degree d
+        residuals: (max_deg, K) sum of squared residuals; row d-1 is for degree d
+    """
+    Y2 = np.asarray(Y, dtype=np.float64).reshape(len(Y), -1)
+    V, Q, R, scale = _vander_qr(x, max_deg)
+    Z = Q.T @ Y2
+    total = np.sum(Y2**2, axis=0)
+    # Clip at zero: when a fit is nearly exact the difference is pure rounding.
+    residuals = np.maximum(total - np.cumsum(Z**2, axis=0), 0)[1:]
+    coeffs = []
+    for d in range(1, max_deg + 1):
+        c = np.linalg.solve(R[:d+1, :d+1], Z[:d+1]) / scale[:d+1, None]
+        coeffs.append(c[::-1])
+    return coeffs, residuals
+
+t0 = time.perf_counter()
+coeffs_all, residuals_all = polyfit_sweep(delta_year, Y, 8)
+t1 = time.perf_counter()
+print(f'degrees 1-8 for {K} series: {t1-t0:.3f} s')
+print('degree 3 matches polyfit_many():', np.allclose(coeffs_all[2], coeffs))
+print('mean squared residual by degree:',
+      np.round(residuals_all.mean(axis=1) / len(year), 3))
+
+# Choose, for each series, the lowest degree whose residual is within 10% of the
+# degree 8 residual:
+
+best = 1 + np.argmax(residuals_all <= 1.1*residuals_all[-1], axis=0)
+print('number of series by chosen degree:', np.bincount(best, minlength=9)[1:])
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Cancellation: For b = 10^k with k = 1, 2, ..., 10, compare the small root of
+   x^2 + b x + 1 from roots() and from solve_quadratics().  At what k does roots()
+   lose all accuracy?
+2. Counting Real Roots: Use the discriminant and np.count_nonzero() to count how
+   many of 1,000,000 random quadratics have real roots.
+3. Real Roots Only: Using roots_many(), find how many of 10,000 random cubics have
+   three real roots (hint: np.abs(r.imag) < 1e-9, and nan compares as False).
+4. Derivatives in Bulk: Add a method derivative() to PolynomialBank that returns a
+   new PolynomialBank holding the derivative of every polynomial (compare with
+   np.polyder() for a few rows).
+5. Finding the Threshold: Time np.polymul() and polymul(..., threshold=0) for
+   random polynomials of length 8, 16, 32, ..., 4096.  At what length does the
+   FFT become faster on your computer?  Is FFT_THRESHOLD a good choice?
+6. Tracking a Step: Feed StreamingPolyfit(1, forgetting=lam) a stream whose mean
+   jumps from 5 to 6 at t = 1000.  For lam = 0.99, 0.999 and 0.9999, how many
+   readings does it take for the fit to come within 0.05 of the new mean?
+7. Why Scale?: Remove the column scaling from _vander_qr() and fit the synthetic
+   data against year instead of delta_year with degree 5.  Compare the largest
+   condition number reported by polyfit_many() with and without scaling.
+"""
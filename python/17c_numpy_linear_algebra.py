@@ -0,0 +1,719 @@
+# Linear Algebra with NumPy: Working in Bulk
+
+"""
+Topics
+------
+Factor Once, Solve Many Times
+Stacks of Small Matrices
+Sparse Matrices and the Conjugate Gradient Method
+"""
+
+import collections
+import hashlib
+import time
+import warnings
+import numpy as np
+
+
+print()
+print('Factor Once, Solve Many Times:')
+print('---------------------------------------')
+
+# In the NumPy lecture we solved A x = b two ways: with np.linalg.solve(A, b),
+# and "by hand" with np.linalg.inv(A) @ b.  Both start by doing about n^3/3
+# multiplications to factorize the n x n matrix A, and both throw that work away
+# when they return.  A common engineering situation is a fixed A (the stiffness
+# matrix of a structure, the conductance matrix of a circuit) and many different
+# right-hand sides b (load cases, input signals) that arrive one at a time.
+#
+# np.linalg.solve() uses the _LU factorization_ with partial pivoting:
+#
+#     P A = L U
+#
+# where P reorders the rows of A, L is lower triangular with 1s on its diagonal,
+# and U is upper triangular.  Once L and U are known, A x = b becomes two
+# triangular systems, each solved by _substitution_ in about n^2 operations:
+#
+#     L y = P b        (forward substitution, top row first)
+#     U x = y          (back substitution, bottom row first)
+#
+# For n = 1000 that is about 2 million operations per solve instead of 333
+# million for a new factorization.
+#
+# NumPy has no function that returns the LU factors (SciPy does, in
+# scipy.linalg.lu_factor), so lu_factor() below computes them.  A column at a
+# time, it picks the largest remaining entry in the column as the _pivot_, swaps
+# it into place, and subtracts multiples of the pivot row from the rows below.
+# To make good use of the fast matrix product @, the columns are handled in
+# _blocks_: after a block of columns is factorized, the rest of the matrix is
+# updated with a single matrix product instead of one row operation at a time.
+
+def lu_factor(A, block=64):
+    """
+    LU factorization with partial pivoting, P A = L U.
+
+    Returns:
+        LU:   (n, n) array holding U on and above the diagonal, and L below it
+              (the 1s on the diagonal of L are not stored)
+        perm: (n,) row order; P A is A[perm]
+    """
+    LU = np.array(A, dtype=np.float64)
+    n = LU.shape[0]
+    perm = np.arange(n)
+    for j in range(0, n, block):
+        end = min(j + block, n)
+        # Factorize the block of columns j..end-1 one column at a time:
+        for k in range(j, end):
+            p = k + np.argmax(np.abs(LU[k:, k]))
+            if p != k:                                   # swap rows k and p
+                LU[[k, p]] = LU[[p, k]]
+                perm[[k, p]] = perm[[p, k]]
+            if LU[k, k] == 0:
+                continue                                 # singular: nothing to eliminate
+            LU[k+1:, k] /= LU[k, k]
+            LU[k+1:, k+1:end] -= np.outer(LU[k+1:, k], LU[k, k+1:end])
+        if end < n:
+            # Finish the rows of U to the right of the block, then update the
+            # rest of the matrix with one matrix product:
+            L11 = np.tril(LU[j:end, j:end], -1) + np.eye(end - j)
+            LU[j:end, end:] = np.linalg.solve(L11, LU[j:end, end:])
+            LU[end:, end:] -= LU[end:, j:end] @ LU[j:end, end:]
+    return LU, perm
+
+# The substitution steps also work in blocks.  The inverse of each small diagonal
+# block of L and of U is computed once, along with the factorization, and each
+# step of the substitution is then a pair of matrix products.
+#
+# Solving with a factorization that is already known only pays off if we can
+# find it again.  LinearSystem keeps the factorizations of recently used
+# matrices in a dictionary (a _cache_).  The dictionary key must identify the
+# _contents_ of A, not the array object, since the same matrix is often rebuilt
+# from scratch.  The hashlib module computes a short _hash_ (a fingerprint) of
+# the raw bytes of A, which takes about n^2 operations; two different matrices
+# have the same fingerprint with negligible probability.
+#
+# Factorizing first also lets us check A before solving anything:
+#
+#   -- A zero pivot means that A is singular (as for the matrix singular in the
+#      NumPy lecture): no solution, or infinitely many.
+#   -- The _condition number_ of A measures how much the solution x can change
+#      for a small change in b.  Roughly, a condition number of 10^k means that
+#      k of the 16 significant digits of float64 are lost.  In the 1-norm it is
+#      ||A|| ||A^-1||, where ||M|| is the largest column sum of |M|.  Computing
+#      A^-1 would cost as much as the factorization, but ||A^-1|| can be
+#      estimated from a handful of solves with A and with its transpose A^T,
+#      using the factors we already have.  Hager's method (as refined by Higham,
+#      and used by LAPACK) looks for the column of A^-1 with the largest sum: it
+#      solves with a vector, then uses the signs of the result and a solve with
+#      A^T to choose the unit vector e_j most likely to increase the estimate.
+#      It stops after at most 5 rounds, and is usually within a factor of 3 of
+#      the exact value (often exact).  Random right-hand sides are not enough:
+#      they can underestimate by a factor of 10 or more.
+
+class LinearSystem:
+    """
+    The linear system A x = b for a fixed square matrix A.
+
+    Attributes:
+        n (int):            size of A
+        cond (float):       estimated condition number of A (inf if singular)
+        singular (bool):    True if A is singular to working precision
+
+    Methods:
+        solve(b):           Returns x; b may be (n,) or (n, k) for k right-hand sides
+        ill_conditioned():  Returns True if the condition number exceeds max_cond
+    """
+    block = 64
+    cache_size = 16
+    max_cond = 1 / np.sqrt(np.finfo(np.float64).eps)     # half the digits lost
+    _cache = collections.OrderedDict()                   # key -> factorization
+
+    def __init__(self, A):
+        A = np.asarray(A, dtype=np.float64)
+        if A.ndim != 2 or A.shape[0] != A.shape[1]:
+            raise ValueError("A must be a square matrix")
+        self.n = A.shape[0]
+        key = (A.shape, hashlib.sha1(np.ascontiguousarray(A)).digest())
+        if key in LinearSystem._cache:
+            LinearSystem._cache.move_to_end(key)         # mark as recently used
+        else:
+            LinearSystem._cache[key] = self._factorize(A)
+            if len(LinearSystem._cache) > self.cache_size:
+                LinearSystem._cache.popitem(last=False)  # drop least recently used
+        self._LU, self._perm, self._L_inv, self._U_inv, self.cond = LinearSystem._cache[key]
+        self.singular = not np.isfinite(self.cond)
+        if self.ill_conditioned() and not self.singular:
+            warnings.warn(f"matrix is ill-conditioned (condition number about {self.cond:.1e})",
+                          RuntimeWarning, stacklevel=2)
+
+    def _factorize(self, A):
+        LU, perm = lu_factor(A, self.block)
+        if self.n == 0:
+            return LU, perm, [], [], 1.0
+        d = np.abs(np.diag(LU))
+        if d.min() <= np.finfo(np.float64).eps * d.max() * self.n:
+            return LU, perm, None, None, np.inf
+        L_inv, U_inv = [], []
+        for j in range(0, self.n, self.block):
+            D = LU[j:j+self.block, j:j+self.block]
+            L_inv.append(np.linalg.inv(np.tril(D, -1) + np.eye(len(D))))
+            U_inv.append(np.linalg.inv(np.triu(D)))
+        self._LU, self._perm, self._L_inv, self._U_inv = LU, perm, L_inv, U_inv
+        cond = np.linalg.norm(A, 1) * self._inverse_norm_estimate()
+        if cond * np.finfo(np.float64).eps >= 1:
+            cond = np.inf
+        return LU, perm, L_inv, U_inv, cond
+
+    def _substitute(self, b):
+        LU, nb = self._LU, self.block
+        y = b[self._perm]
+        for i, j in enumerate(range(0, self.n, nb)):              # L y = P b
+            y[j:j+nb] = self._L_inv[i] @ (y[j:j+nb] - LU[j:j+nb, :j] @ y[:j])
+        starts = list(range(0, self.n, nb))
+        for i in reversed(range(len(starts))):                    # U x = y
+            j = starts[i]
+            y[j:j+nb] = self._U_inv[i] @ (y[j:j+nb] - LU[j:j+nb, j+nb:] @ y[j+nb:])
+        return y
+
+    def _substitute_transpose(self, b):
+        # Solve A^T z = b.  Since A[perm] = L U, this is U^T w = b (forward),
+        # then L^T u = w (backward), then z[perm] = u:
+        LU, nb = self._LU, self.block
+        w = np.array(b, dtype=np.float64)
+        starts = list(range(0, self.n, nb))
+        for i, j in enumerate(starts):                            # U^T w = b
+            w[j:j+nb] = self._U_inv[i].T @ (w[j:j+nb] - LU[:j, j:j+nb].T @ w[:j])
+        for i in reversed(range(len(starts))):                    # L^T u = w
+            j = starts[i]
+            w[j:j+nb] = self._L_inv[i].T @ (w[j:j+nb] - LU[j+nb:, j:j+nb].T @ w[j+nb:])
+        z = np.empty_like(w)
+        z[self._perm] = w
+        return z
+
+    def _inverse_norm_estimate(self, max_rounds=5):
+        # Hager's method with Higham's refinements (LAPACK xLACON):
+        n = self.n
+        x = np.full(n, 1 / n)
+        estimate, signs, j = 0.0, None, None
+        for rounds in range(max_rounds):
+            y = self._substitute(x)
+            new_estimate = np.abs(y).sum()
+            new_signs = np.where(y >= 0, 1.0, -1.0)
+            if rounds > 0 and (new_estimate <= estimate or np.array_equal(new_signs, signs)):
+                estimate = max(estimate, new_estimate)
+                break                                 # no further progress
+            estimate, signs = new_estimate, new_signs
+            z = self._substitute_transpose(signs)
+            new_j = int(np.argmax(np.abs(z)))
+            if rounds > 0 and (new_j == j or np.abs(z[new_j]) <= z @ x):
+                break                                 # e_j would not improve it
+            j = new_j
+            x = np.zeros(n)
+            x[j] = 1.0
+        # Higham's extra test vector catches matrices that fool the iteration:
+        alt = (-1.0)**np.arange(n) * (1 + np.arange(n) / max(n - 1, 1))
+        alt_estimate = 2 * np.abs(self._substitute(alt)).sum() / (3 * n)
+        return max(estimate, alt_estimate)
+
+    def ill_conditioned(self):
+        return self.cond > self.max_cond
+
+    def solve(self, b):
+        if self.singular:
+            raise np.linalg.LinAlgError("matrix is singular")
+        b = np.asarray(b, dtype=np.float64)
+        if b.shape[0] != self.n:
+            raise ValueError(f"b must have {self.n} rows")
+        return self._substitute(b)
+
+# The system from the NumPy lecture:
+
+A = np.array([[2, 1, 0],
+              [3, 5, 2],
+              [1, 0, 4]])
+b = np.array([5, 15, 8])
+system = LinearSystem(A)
+print("Solution x:", np.round(system.solve(b), 4))
+print("Solution x:", np.round(np.linalg.solve(A, b), 4))
+
+# Several right-hand sides at once, as the columns of a matrix:
+
+print(np.round(system.solve(np.column_stack([b, 2*b, [1, 0, 0]])), 4))
+
+# The singular matrix is detected without attempting an inverse:
+
+singular = np.array([[1, 2],
+                     [2, 4]])
+s = LinearSystem(singular)
+print("singular:", s.singular)
+try:
+    s.solve([1, 2])
+except np.linalg.LinAlgError as err:
+    print("LinAlgError:", err)
+
+# An ill-conditioned matrix: the Hilbert matrix H[i, j] = 1/(i + j + 1) is a
+# famous example.  Compare the estimate with np.linalg.cond(H, 1):
+
+i = np.arange(10)
+H = 1 / (i[:, None] + i + 1)
+with warnings.catch_warnings(record=True) as caught:
+    warnings.simplefilter('always')
+    h = LinearSystem(H)
+print("warning:", caught[0].message if caught else None)
+print(f"estimated condition number: {h.cond:.2e}   np.linalg.cond(): {np.linalg.cond(H, 1):.2e}")
+
+
+# ---------------
+# Speed comparison
+# ---------------
+
+# A 500 x 500 matrix and 300 right-hand sides arriving one at a time:
+
+n, k = 500, 300
+rng = np.random.default_rng(0)
+M = rng.standard_normal((n, n)) + n*np.eye(n)
+loads = rng.standard_normal((k, n))
+
+t0 = time.perf_counter()
+x_inv = [np.linalg.inv(M) @ b for b in loads]
+t1 = time.perf_counter()
+x_solve = [np.linalg.solve(M, b) for b in loads]
+t2 = time.perf_counter()
+system = LinearSystem(M)
+x_kept = [system.solve(b) for b in loads]
+t3 = time.perf_counter()
+x_cached = [LinearSystem(M.copy()).solve(b) for b in loads]
+t4 = time.perf_counter()
+x_batch = LinearSystem(M).solve(loads.T)
+t5 = time.perf_counter()
+
+print(f'np.linalg.inv(A) @ b:              {t1-t0:.3f} s')
+print(f'np.linalg.solve(A, b):             {t2-t1:.3f} s')
+print(f'one LinearSystem, solve(b):        {t3-t2:.3f} s')
+print(f'LinearSystem(copy of A).solve(b):  {t4-t3:.3f} s')
+print(f'all b at once (cached):            {t5-t4:.3f} s')
+
+# Rebuilding the LinearSystem for every b still finds the factorization in the
+# cache, but computing the fingerprint reads all n^2 entries of A each time,
+# which costs about as much as the solve itself.  Keep the LinearSystem object
+# when you can.
+
+print('results agree:', np.allclose(x_solve, x_kept) and np.allclose(x_solve, x_cached)
+      and np.allclose(x_solve, x_batch.T))
+
+
+print()
+print('Stacks of Small Matrices:')
+print('---------------------------------------')
+
+# Many engineering calculations involve huge numbers of tiny matrices and
+# vectors: a torque r x F for every node of a mesh, a 2 x 2 or 3 x 3 Jacobian
+# matrix for every element of a finite element model, a rotation for every
+# particle.  Calling np.linalg.det(), np.linalg.inv() or np.linalg.solve() on
+# each 3 x 3 matrix in a loop is dominated by overhead: checking the arguments,
+# calling into LAPACK, and creating a new result array, all to do a few dozen
+# multiplications.
+#
+# We store N small matrices as one _stack_, an array of shape (N, 2, 2) or
+# (N, 3, 3), so M[i] is the i-th matrix and M[:, 0, 1] holds the (0, 1) entry of
+# every matrix.  For matrices this small there are closed-form formulas:
+#
+#     2 x 2:   det [[a, b],       = a d - b c
+#                   [c, d]]
+#              inv = [[d, -b], [-c, a]] / det
+#
+#     3 x 3:   det [[a, b, c],    = a (e i - f h) + b (f g - d i) + c (d h - e g)
+#                   [d, e, f],
+#                   [g, h, i]]
+#              inv = adj / det, where adj is the _adjugate_ (transposed matrix
+#              of cofactors) built from the same 2 x 2 determinants
+#
+# Written with whole-stack arrays, each step of a formula is done for all N
+# matrices at once.  In the stack, the entries of one matrix sit next to each
+# other in memory, so M[:, 0, 1] picks every ninth number.  _components() first
+# copies the stack into "components-first" order, one contiguous array of N
+# values per entry, so that every step of the formulas runs over contiguous
+# memory.
+#
+# solve_small() uses x = adj b / det, i.e. Cramer's rule.  Unlike
+# np.linalg.solve() it does not pivot, so for badly conditioned matrices it
+# loses more accuracy; for the well-conditioned small matrices of most geometry
+# problems it is fine.  Singular matrices give inf or nan rather than an error,
+# so that one bad matrix does not stop the whole stack; check det_small() if
+# that can happen.
+
+def _components(M):
+    # Returns n, the n*n entries as contiguous arrays (row by row), and the
+    # shape of the stack:
+    M = np.asarray(M, dtype=np.float64)
+    if M.shape[-2:] not in ((2, 2), (3, 3)):
+        raise ValueError("matrices must be 2 x 2 or 3 x 3")
+    n = M.shape[-1]
+    return n, np.ascontiguousarray(M.reshape(-1, n*n).T), M.shape[:-2]
+
+def _adjugate(n, m):
+    # Returns the entries of the adjugate (row by row) and the determinant:
+    if n == 2:
+        a, b, c, d = m
+        return [d, -b, -c, a], a*d - b*c
+    a, b, c, d, e, f, g, h, i = m
+    A, B, C = e*i - f*h, f*g - d*i, d*h - e*g
+    adj = [A, c*h - b*i, b*f - c*e,
+           B, a*i - c*g, c*d - a*f,
+           C, b*g - a*h, a*e - b*d]
+    return adj, a*A + b*B + c*C
+
+def cross_many(a, b):
+    """Cross products of stacks of 3-vectors, shape (..., 3), like np.cross()."""
+    a, b = np.asarray(a), np.asarray(b)
+    if a.shape[-1:] != (3,) or b.shape[-1:] != (3,):
+        raise ValueError("vectors must have 3 components")
+    a0, a1, a2 = a[..., 0], a[..., 1], a[..., 2]
+    b0, b1, b2 = b[..., 0], b[..., 1], b[..., 2]
+    return np.stack([a1*b2 - a2*b1, a2*b0 - a0*b2, a0*b1 - a1*b0], axis=-1)
+
+def det_small(M):
+    """Determinants of a stack of 2 x 2 or 3 x 3 matrices."""
+    n, m, shape = _components(M)
+    if n == 2:
+        a, b, c, d = m
+        det = a*d - b*c
+    else:
+        a, b, c, d, e, f, g, h, i = m
+        det = a*(e*i - f*h) + b*(f*g - d*i) + c*(d*h - e*g)
+    return det.reshape(shape)
+
+def inv_small(M):
+    """Inverses of a stack of 2 x 2 or 3 x 3 matrices."""
+    n, m, shape = _components(M)
+    adj, det = _adjugate(n, m)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = np.stack(adj, axis=-1) / det[:, None]
+    return inv.reshape(shape + (n, n))
+
+def matvec_small(M, v):
+    """Matrix-vector products M[i] @ v[i] for a stack of small matrices."""
+    # np.einsum() spells out the sum over j of M[..., i, j] * v[..., j]:
+    return np.einsum('...ij,...j->...i', M, v)
+
+def solve_small(M, b):
+    """Solve M[i] x[i] = b[i] for a stack of 2 x 2 or 3 x 3 systems."""
+    n, m, shape = _components(M)
+    adj, det = _adjugate(n, m)
+    v = np.ascontiguousarray(np.asarray(b, dtype=np.float64).reshape(-1, n).T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.stack([sum(adj[i*n + j]*v[j] for j in range(n)) / det
+                      for i in range(n)], axis=-1)
+    return x.reshape(shape + (n,))
+
+# The torque example from the NumPy lecture, and the matrix from the eigenvector
+# example:
+
+r = np.array([0.5, 0, 0])
+F = np.array([0, 10, 0])
+print("Torque =", cross_many(r, F))
+A = np.array([[2, 1],
+              [1, 3]])
+print("det(A) =", det_small(A), "  inv(A) =\n", inv_small(A))
+A = np.array([[2, 1, 0],
+              [3, 5, 2],
+              [1, 0, 4]])
+print("inv_small(A) @ A is I:", np.allclose(inv_small(A) @ A, np.eye(3)))
+print("solve_small(A, b):", solve_small(A, [5, 15, 8]))
+
+# Torques for 1,000,000 position/force pairs, and 1,000,000 random 3 x 3 systems:
+
+N = 1_000_000
+rng = np.random.default_rng(1)
+r = rng.standard_normal((N, 3))
+F = rng.standard_normal((N, 3))
+M = rng.standard_normal((N, 3, 3)) + 3*np.eye(3)
+b = rng.standard_normal((N, 3))
+
+def timed(label, func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    print(f'{label:<34}{time.perf_counter() - t0:.3f} s')
+    return result
+
+# np.linalg in a Python loop (only the first 20,000 matrices, scaled up to N):
+n_loop = 20_000
+for label, func, args in [('det', np.linalg.det, (M,)),
+                          ('inv', np.linalg.inv, (M,)),
+                          ('solve', np.linalg.solve, (M, b))]:
+    t0 = time.perf_counter()
+    for i in range(n_loop):
+        func(*(a[i] for a in args))
+    print(f'loop of np.linalg.{label:<16}{(time.perf_counter() - t0)*N/n_loop:.3f} s (estimated)')
+
+timed('np.linalg.det(stack)', np.linalg.det, M)
+timed('det_small(stack)', det_small, M)
+timed('np.linalg.inv(stack)', np.linalg.inv, M)
+timed('inv_small(stack)', inv_small, M)
+x1 = timed('np.linalg.solve(stack)', np.linalg.solve, M, b[..., None])[..., 0]
+x2 = timed('solve_small(stack)', solve_small, M, b)
+timed('np.matmul(stack)', np.matmul, M, b[..., None])
+timed('matvec_small(stack)', matvec_small, M, b)
+t1 = timed('np.cross()', np.cross, r, F)
+t2 = timed('cross_many()', cross_many, r, F)
+print('solutions agree:', np.allclose(x1, x2), '  torques agree:', np.allclose(t1, t2))
+
+# Note that np.linalg.det(), inv() and solve() also accept stacks of matrices
+# directly (np.linalg.solve() needs b with shape (N, 3, 1), one column each),
+# which removes the Python loop and most of the overhead.  The closed-form
+# versions skip the general-purpose LAPACK machinery (pivoting, error checks)
+# as well.  np.cross() is already a whole-stack operation, so cross_many() only
+# matches it.
+
+
+print()
+print('Sparse Matrices and the Conjugate Gradient Method:')
+print('---------------------------------------')
+
+# In a finite element or circuit model, each unknown is connected only to a few
+# neighbours, so almost every entry of the system matrix is zero.  A model with
+# 1,000,000 unknowns has a 10^6 x 10^6 matrix: 8 terabytes as a dense float64
+# array, even though only about 5 million of its entries are nonzero.
+#
+# A _sparse_ matrix format stores only the nonzero entries.  The most common one
+# is _compressed sparse row_ (CSR), made of three arrays:
+#
+#     data:    the nonzero values, row by row
+#     indices: the column of each value in data
+#     indptr:  row i occupies data[indptr[i]:indptr[i+1]] (length n_rows + 1)
+#
+# For example:
+#
+#     [[4, 0, 1],        data    = [4, 1, 2, 3, 5]
+#      [0, 2, 0],  -->   indices = [0, 2, 1, 0, 2]
+#      [3, 0, 5]]        indptr  = [0, 2, 3, 5]
+#
+# Models are usually _assembled_ one element at a time, each element adding its
+# contribution to a few entries.  The easy way to collect these is as a list of
+# (row, column, value) _triplets_, also called COO (coordinate) format, where
+# the same entry may appear many times.  from_coo() sorts the triplets by row and
+# column and adds up the duplicates.
+#
+# (SciPy provides all of this, and much more, in scipy.sparse.  The version here
+# shows how it works using NumPy alone.)
+
+class CSRMatrix:
+    """
+    Sparse matrix in compressed sparse row format.
+
+    Attributes:
+        data (np.ndarray):    nonzero values, row by row
+        indices (np.ndarray): column index of each value
+        indptr (np.ndarray):  row i is data[indptr[i]:indptr[i+1]]
+        shape (tuple):        (rows, columns)
+
+    Methods:
+        from_coo(rows, cols, values, shape): Builds a matrix from triplets (duplicates are added)
+        matvec(x):   Returns A @ x
+        rmatvec(y):  Returns A.T @ y
+        diagonal():  Returns the main diagonal
+        todense():   Returns a dense 2D array
+    """
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n_rows, n_cols = shape
+        if len(rows) and (rows.min() < 0 or rows.max() >= n_rows):
+            raise IndexError("row index out of range")
+        if len(cols) and (cols.min() < 0 or cols.max() >= n_cols):
+            raise IndexError("column index out of range")
+        # One integer key per (row, column) puts the triplets in CSR order when
+        # sorted, and makes duplicates adjacent:
+        keys = rows * n_cols + cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        starts = np.flatnonzero(first)
+        data = np.add.reduceat(values[order], starts) if len(starts) else values[:0]
+        keys = keys[starts]
+        indices = (keys % n_cols).astype(np.int32)
+        counts = np.bincount(keys // n_cols, minlength=n_rows)
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(data, indices, indptr, shape)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    def matvec(self, x):
+        # Multiply every stored value by the x entry in its column, then add up
+        # each row's products.  np.add.reduceat() sums the segments that start
+        # at the given positions; empty rows have no segment and stay 0.
+        products = self.data * x[self.indices]
+        y = np.zeros(self.shape[0])
+        starts = self.indptr[:-1]
+        nonempty = starts < self.indptr[1:]
+        if products.size:
+            y[nonempty] = np.add.reduceat(products, starts[nonempty])
+        return y
+
+    def __matmul__(self, x):
+        return self.matvec(x)
+
+    def rmatvec(self, y):
+        # A.T @ y: value (i, j) adds data * y[i] to entry j of the result.
+        row_of = np.repeat(y, np.diff(self.indptr))
+        return np.bincount(self.indices, weights=self.data * row_of,
+                           minlength=self.shape[1])
+
+    def diagonal(self):
+        d = np.zeros(min(self.shape))
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        on_diagonal = rows == self.indices
+        d[rows[on_diagonal]] = self.data[on_diagonal]
+        return d
+
+    def todense(self):
+        A = np.zeros(self.shape)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        A[rows, self.indices] = self.data
+        return A
+
+# The example above, with a duplicate triplet for entry (2, 2) = 2 + 3:
+
+rows = [0, 0, 1, 2, 2, 2]
+cols = [0, 2, 1, 0, 2, 2]
+vals = [4, 1, 2, 3, 2, 3]
+S = CSRMatrix.from_coo(rows, cols, vals, (3, 3))
+print('data:   ', S.data)
+print('indices:', S.indices)
+print('indptr: ', S.indptr)
+x = np.array([1.0, 2.0, 3.0])
+print('S @ x:  ', S @ x, ' dense:', S.todense() @ x)
+print('S.T @ x:', S.rmatvec(x), ' dense:', S.todense().T @ x)
+
+
+# ---------------
+# Solving sparse systems: conjugate gradients
+# ---------------
+
+# np.linalg.solve() needs a dense matrix, and factorizing fills in many of the
+# zeros anyway.  _Iterative_ methods instead improve a guess for x step by step,
+# and use A only through products A @ p, which are cheap for a sparse matrix.
+#
+# For a _symmetric positive definite_ matrix (as produced by springs, heat
+# conduction, resistor networks and most structural models), the standard
+# choice is the _conjugate gradient_ (CG) method.  Each step finds the best
+# solution within a growing set of search directions, using one matrix-vector
+# product and a few vector operations.
+#
+# The number of steps grows with the condition number of A.  A _preconditioner_
+# is a cheap approximation of A^-1 that is applied to the residual at each step
+# to reduce it.  The simplest is the _Jacobi_ preconditioner, which divides by
+# the diagonal of A.  It costs almost nothing and helps a lot when the stiffness
+# varies strongly from one part of the model to another.
+
+def cg(A, b, tol=1e-8, max_iter=None, jacobi=True):
+    """
+    Solve A x = b with the (Jacobi preconditioned) conjugate gradient method.
+
+    Parameters:
+        A:        symmetric positive definite matrix; anything supporting A @ x
+        b:        right-hand side
+        tol:      stop when ||b - A x|| <= tol * ||b||
+        max_iter: maximum number of steps (default: len(b))
+        jacobi:   use the Jacobi (diagonal) preconditioner
+
+    Returns:
+        x:        the solution
+        history:  list of residual norms, one per step
+    """
+    b = np.asarray(b, dtype=np.float64)
+    max_iter = len(b) if max_iter is None else max_iter
+    inv_diag = 1 / A.diagonal() if jacobi else np.ones(len(b))
+    x = np.zeros_like(b)
+    r = b.copy()                      # residual b - A x
+    z = inv_diag * r                  # preconditioned residual
+    p = z.copy()                      # search direction
+    rz = r @ z
+    target = tol * np.linalg.norm(b)
+    history = [np.linalg.norm(r)]
+    for _ in range(max_iter):
+        if history[-1] <= target:
+            break
+        Ap = A @ p
+        alpha = rz / (p @ Ap)
+        x += alpha * p
+        r -= alpha * Ap
+        z = inv_diag * r
+        rz, rz_old = r @ z, rz
+        p = z + (rz / rz_old) * p
+        history.append(np.linalg.norm(r))
+    return x, history
+
+# A test problem: a square grid of nodes joined by springs of random stiffness
+# (between 1 and 1000), with the nodes on the edge also tied to the ground.  Each
+# spring between nodes i and j adds its stiffness k to entries (i, i) and (j, j)
+# and subtracts it from (i, j) and (j, i), exactly as in a finite element
+# assembly.  The load is 1 at every node.
+
+def spring_grid(m, rng):
+    """Assemble the stiffness matrix of an m x m grid of springs."""
+    node = np.arange(m*m).reshape(m, m)
+    i = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel()])
+    j = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel()])
+    k = 10 ** rng.uniform(0, 3, len(i))
+    edge = np.concatenate([node[0], node[-1], node[1:-1, 0], node[1:-1, -1]])
+    rows = np.concatenate([i, j, i, j, edge])
+    cols = np.concatenate([i, j, j, i, edge])
+    vals = np.concatenate([k, k, -k, -k, np.full(len(edge), 1.0)])
+    return CSRMatrix.from_coo(rows, cols, vals, (m*m, m*m))
+
+for m in [20, 40, 60]:
+    K = spring_grid(m, rng)
+    f = np.ones(m*m)
+    t0 = time.perf_counter()
+    K_dense = K.todense()
+    x_dense = np.linalg.solve(K_dense, f)
+    t1 = time.perf_counter()
+    x_plain, plain = cg(K, f, jacobi=False)
+    t2 = time.perf_counter()
+    x_cg, history = cg(K, f)
+    t3 = time.perf_counter()
+    print(f'{m*m:>6} unknowns: dense {K_dense.nbytes/2**20:7.1f} MB {t1-t0:6.3f} s | '
+          f'CSR {K.nbytes/2**20:5.2f} MB | CG {len(plain)-1:>5} steps {t2-t1:6.3f} s | '
+          f'Jacobi CG {len(history)-1:>4} steps {t3-t2:6.3f} s | '
+          f'agree: {np.allclose(x_dense, x_cg, rtol=1e-6)}')
+
+# Far beyond the sizes where a dense matrix fits in memory:
+
+m = 200
+K = spring_grid(m, rng)
+t0 = time.perf_counter()
+x_cg, history = cg(K, np.ones(m*m))
+t1 = time.perf_counter()
+print(f'{m*m:,} unknowns: CSR {K.nbytes/2**20:.1f} MB (dense would be '
+      f'{(m*m)**2*8/2**30:,.0f} GB), {len(history)-1} steps, {t1-t0:.2f} s')
+print('relative residual:', np.linalg.norm(np.ones(m*m) - K @ x_cg) / np.linalg.norm(np.ones(m*m)))
+
+
+"""
+PRACTICE PROBLEMS
+
+1. Cache Hits: Add a class attribute to LinearSystem that counts how many times a
+   factorization was found in the cache, and print it after the speed comparison.
+2. Jacobians: For a stack of N triangles with corners P0, P1, P2 (each (N, 2)),
+   build the 2 x 2 matrices J = [P1 - P0, P2 - P0] (as columns) and use
+   det_small() to compute all N triangle areas at once.
+3. Convergence Plot: Use matplotlib to plot the residual history returned by cg()
+   on a log scale, with and without the Jacobi preconditioner, for the 60 x 60
+   spring grid.
+"""